@@ -0,0 +1,229 @@
+#Benchmarks for CoNLLUTools and ADVextractor, to keep track of speed and memory across versions
+#Synthetic CoNLL-U corpora of different sizes are generated locally; real documents can be added, and their ADV tables are checked against the ones already provided in this repository, if any
+#Results are printed (or saved) as JSON
+
+import os, sys, time, json, random, tempfile, tracemalloc
+from contextlib import redirect_stdout
+
+#Importing own scripts for CoNLL-U manipulations, and the extractor itself
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),'Tools'))
+import CoNLLUTools
+import ADVextractor
+
+#Default sizes of synthetic corpora, in sentences
+sizes = {'small' : 500, 'medium' : 5000, 'large' : 20000}
+
+
+##Synthetic data
+
+#Vocabulary of the synthetic corpora: a few adverbs (some with lemmas differing from forms) and some words of other parts of speech, partly coinciding with them
+synthadverbs = [('so','so'),('also','also'),('now','now'),('well','well'),('fast','fast'),('here','here'),('then','then'),('very','very'),('more','much'),('bene','bene'),('melius','bene'),('saepe','saepe'),('fecundius','fecunde'),('iam','iam')]
+synthwords = {'NOUN' : ['dog','house','fast','home'], 'VERB' : ['run','is','go','well'], 'ADJ' : ['fast','good','more'], 'PRON' : ['it','that'], 'DET' : ['the','so'], 'ADP' : ['in','up','over'], 'AUX' : ['is','has'], 'CCONJ' : ['and','or'], 'PROPN' : ['Rome'], 'NUM' : ['two'], 'PART' : ['not'], 'SCONJ' : ['that','then'], 'PUNCT' : [',','.']}
+synthrels = {'NOUN' : ['nsubj','obj','obl','nmod','conj','obl:arg'], 'VERB' : ['advcl','ccomp','xcomp','conj','parataxis'], 'ADJ' : ['amod','xcomp','conj'], 'PRON' : ['nsubj','obj'], 'DET' : ['det'], 'ADP' : ['case'], 'AUX' : ['aux','cop'], 'CCONJ' : ['cc'], 'PROPN' : ['nsubj','flat'], 'NUM' : ['nummod'], 'PART' : ['advmod'], 'SCONJ' : ['mark'], 'PUNCT' : ['punct'], 'ADV' : ['advmod','advmod','advmod:tmod','conj','obl','fixed','dep']}
+synthfeats = {'NOUN' : ['Number=Sing','Number=Plur'], 'VERB' : ['Mood=Ind|Tense=Pres','VerbForm=Inf'], 'ADJ' : ['Degree=Pos','Degree=Cmp'], 'PRON' : ['PronType=Prs','PronType=Dem'], 'ADV' : ['_','_','Degree=Pos','Degree=Cmp','PronType=Dem','Degree=Sup|Polarity=Neg']}
+
+#A CoNLL-U document with random, but well-formed trees: heads always precede their dependents, apart from the root, so that there are no cycles
+#Multiword tokens and empty nodes are added from time to time
+def synthesise(path,sentences,seed=0) :
+
+	rnd = random.Random(seed)
+
+	with open(path,'w',encoding='utf8') as document :
+		for s in range(sentences) :
+
+			n = rnd.randint(3,30)
+			root = rnd.randint(1,n)
+			mwt = rnd.randint(1,n-1) if rnd.random() < 0.1 else None
+			rows = []
+
+			for i in range(1,n+1) :
+				if i == mwt :
+					rows.append('{}-{}\t{}\t_\t_\t_\t_\t_\t_\t_\t_'.format(i,i+1,'mwt'))
+				upos = 'ADV' if rnd.random() < 0.2 else rnd.choice(list(synthwords))
+				form, lemma = rnd.choice(synthadverbs) if upos == 'ADV' else (rnd.choice(synthwords[upos]),)*2
+				head = 0 if i == root else rnd.choice(range(1,i)) if i > 1 and (i > root or rnd.random() < 0.5) else root
+				deprel = 'root' if i == root else rnd.choice(synthrels[upos])
+				feats = rnd.choice(synthfeats.get(upos,['_']))
+				rows.append('\t'.join([str(i),form.capitalize() if rnd.random() < 0.1 else form,lemma,upos,'_',feats,str(head),deprel,'_','SpaceAfter=No' if rnd.random() < 0.1 else '_']))
+				if rnd.random() < 0.01 :
+					rows.append('{}.1\t{}\t_\tVERB\t_\t_\t_\t_\t{}:conj\t_'.format(i,'empty',i))
+
+			document.write('# sent_id = synth-{}\n# text = {}\n{}\n\n'.format(s,'',('\n'.join(rows))))
+#
+
+
+##Measures
+
+#Time and peak memory of a function; memory is measured in a second run, as tracing allocations slows everything down
+def measure(function,memory=True) :
+
+	start = time.perf_counter()
+	result = function()
+	seconds = time.perf_counter() - start
+
+	peak = None
+	if memory :
+		tracemalloc.start()
+		function()
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+
+	return result, seconds, peak
+#
+
+#A single record of the results
+def record(corpus,phase,representation,tokens,seconds,peak) :
+
+	return {'corpus' : corpus, 'phase' : phase, 'representation' : representation, 'tokens' : tokens, 'seconds' : round(seconds,6), 'tokens_per_second' : round(tokens/seconds) if seconds else None, 'peak_memory' : peak}
+#
+
+#Benchmarks of the single methods of CoNLLUTools on a document, for both tree representations
+def benchmarktools(corpus,path,memory=True) :
+
+	results = []
+	for representation, compact in (('graph',False),('compact',True)) :
+		results.extend(benchmarkrepresentation(corpus,path,representation,compact,memory))
+
+	return results
+#
+
+#Benchmarks of the single methods of CoNLLUTools for a tree representation; trees only live as long as this function, so that they do not weigh on the following measures
+def benchmarkrepresentation(corpus,path,representation,compact,memory=True) :
+
+	results = []
+
+	#A first sentence is read without measuring, so that lazy imports (e.g. of networkx, for graphs) are not counted
+	next(CoNLLUTools.readCoNLLU(path,compact=compact),None)
+
+	#Parsing, also counting syntactic words
+	count = lambda : sum(sum(1 for n in a if n[0] > 0 and n[1] == 0) for _,a in CoNLLUTools.readCoNLLU(path,compact=compact))
+	tokens, seconds, peak = measure(count,memory)
+	results.append(record(corpus,'readCoNLLU',representation,tokens,seconds,peak))
+
+	#All other methods work on trees which have already been read
+	trees = [a for _,a in CoNLLUTools.readCoNLLU(path,compact=compact)]
+	words = [(a,n) for a in trees for n in CoNLLUTools.syntacticwords(a)]
+
+	phases = (('syntacticwords', lambda : sum(1 for a in trees for _ in CoNLLUTools.syntacticwords(a))),\
+			  ('truehead', lambda : [CoNLLUTools.truehead(a,n.id,conj=ADVextractor.horizontal) for a,n in words]),\
+			  ('extractnucleus', lambda : [CoNLLUTools.extractnucleus(a,n.id,funcrel=ADVextractor.dependentrels) for a,n in words]),\
+			  ('writeUDfeatures', lambda : [CoNLLUTools.writeUDfeatures(n.feats) for _,n in words]))
+
+	for phase, function in phases :
+		if compact : #memoised results must not be carried over from one measure to the other
+			for a in trees :
+				a.memo.clear()
+		_, seconds, peak = measure(function,memory)
+		results.append(record(corpus,phase,representation,len(words),seconds,peak))
+
+	return results
+#
+
+#Benchmark of the whole ADVextractor pipeline on a group of documents, whose tables are written in a temporary folder, which is returned together with the results
+def benchmarkpipeline(corpus,texts,output,memory=True,jobs=1) :
+
+	with open(os.devnull,'w') as devnull, redirect_stdout(devnull) :
+		pipeline = lambda : ADVextractor.writetables(ADVextractor.extract(texts,jobs=jobs),output)
+		_, seconds, peak = measure(pipeline,memory and jobs == 1) #memory of worker processes cannot be traced
+
+	tokens = sum(sum(1 for n in a if n[0] > 0 and n[1] == 0) for t in texts for _,a in CoNLLUTools.readCoNLLU(t,compact=True))
+
+	return [record(corpus,'ADVextractor','compact' if jobs == 1 else 'compact, {} jobs'.format(jobs),tokens,seconds,peak)]
+#
+
+
+##Checks
+
+#A table up to the order of its rows and of the elements of lists: comma-separated ones in any cell, space-separated ones in ADV_nominals.tsv (whose ties can come in any order), and whole rows of ADV_coord.tsv, i.e. groups of co-ordinated ADVs, listed in set order in the tables of this repository
+def normalisetable(name,table) :
+
+	rows = []
+	for row in table.split('\n') :
+		if row :
+			cells = [','.join(sorted(cell.split(','))) for cell in row.split('\t')]
+			if name == 'ADV_nominals.tsv' :
+				cells = [' '.join(sorted(cell.split(' '))) for cell in cells]
+			elif name == 'ADV_coord.tsv' :
+				cells = sorted(cells)
+			rows.append('\t'.join(cells))
+
+	return sorted(rows)
+#
+
+#Comparison of the tables produced for a group of documents with the ones provided in this repository, if any
+#Tables are either identical, identical up to the order of rows and of the elements of lists (see normalisetable), or different
+def checktables(output,reference) :
+
+	checks = {}
+	for table in sorted(os.listdir(reference)) :
+		if not table.startswith('ADV_') or not table.endswith('.tsv') :
+			continue
+		with open(os.path.join(reference,table),encoding='utf8') as r, open(os.path.join(output,table),encoding='utf8') as o :
+			expected, produced = r.read(), o.read()
+		checks[table] = 'identical' if expected == produced else 'reordered' if normalisetable(table,expected) == normalisetable(table,produced) else 'different'
+
+	return checks
+#
+
+
+##Main
+
+if __name__ == '__main__' :
+
+	import argparse, platform, subprocess
+
+	parser = argparse.ArgumentParser(description='Benchmarks for CoNLLUTools and ADVextractor, on synthetic and real CoNLL-U documents.')
+	parser.add_argument('groups', nargs='*', help='Real CoNLL-U documents, as given to ADVextractor (a single document, a folder path, or a comma-separated list of file/paths); every argument is a group, whose tables are checked against the ones of this repository.')
+	parser.add_argument('--sizes', default=','.join('{}={}'.format(k,v) for k,v in sizes.items()), help='Synthetic corpora to generate, as comma-separated name=sentences couples; empty for none (default: %(default)s).')
+	parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes for the pipeline, also measured with a single process (default: 1).')
+	parser.add_argument('--no-memory', dest='memory', action='store_false', help='Do not measure peak memory, which doubles the running time.')
+	parser.add_argument('--output', help='JSON file where results are saved, instead of printing them.')
+	args = parser.parse_args()
+
+	repository = os.path.dirname(os.path.abspath(__file__))
+	try :
+		commit = subprocess.run(['git','rev-parse','HEAD'],cwd=repository,capture_output=True,text=True).stdout.strip() or None
+	except (OSError) :
+		commit = None
+
+	report = {'commit' : commit, 'python' : platform.python_version(), 'platform' : platform.platform(), 'results' : [], 'checks' : {}}
+
+	with tempfile.TemporaryDirectory() as temporary :
+
+		#Synthetic corpora
+		corpora = []
+		for size in filter(None,args.sizes.split(',')) :
+			name, _, sentences = size.partition('=')
+			path = os.path.join(temporary,'synth_{}.conllu'.format(name))
+			synthesise(path,int(sentences))
+			corpora.append((name,[path]))
+
+		#Real documents
+		for group in args.groups :
+			texts = ADVextractor.collecttexts(group)
+			if texts :
+				corpora.append((ADVextractor.outputname(texts),texts))
+
+		for corpus, texts in corpora :
+
+			print(corpus,file=sys.stderr)
+
+			for text in texts :
+				report['results'].extend(benchmarktools(corpus if len(texts) == 1 else '{}:{}'.format(corpus,os.path.basename(text)),text,args.memory))
+
+			output = os.path.join(temporary,corpus)
+			os.makedirs(output,exist_ok=True)
+			report['results'].extend(benchmarkpipeline(corpus,texts,output,args.memory))
+			if args.jobs > 1 :
+				report['results'].extend(benchmarkpipeline(corpus,texts,output,args.memory,jobs=args.jobs))
+
+			reference = os.path.join(repository,ADVextractor.outputname(texts))
+			if os.path.isdir(reference) :
+				report['checks'][corpus] = checktables(output,reference)
+
+	if args.output :
+		with open(args.output,'w',encoding='utf8') as results :
+			json.dump(report,results,indent=1)
+	else :
+		print(json.dumps(report,indent=1))
+#
@@ -1,224 +1,859 @@
-#Code to extract adverbs (ADV) from CoNLL-U files, and to present their distribution and various statistics. Please refer to 
+#Code to extract adverbs (ADV) from CoNLL-U files, and to present their distribution and various statistics. Please refer to
 #Edition note: some slight improvements and tweaks have been implemented, so the data produced could not coincide 100% with those presented in the paper, but substantially it does
 
-import os, sys
+import os, sys, time, difflib
 from collections import namedtuple, Counter, defaultdict
 
 #Importing own scripts for CoNLL-U manipulations
 sys.path.insert(0, './Tools/')
 import CoNLLUTools
-#TECHNICAL NOTE: Theoretically, Udapi could be used for this. But because of inaccessibility and impenetrability of its documentation, 
-#at the moment I find it easier to do very simple tree-search operations as the ones performed here, 
+#TECHNICAL NOTE: Theoretically, Udapi could be used for this. But because of inaccessibility and impenetrability of its documentation,
+#at the moment I find it easier to do very simple tree-search operations as the ones performed here,
 #by means of own-created code. Every suggestion to make the script more open is welcome.
 
-#Input
-try :
-	folder = sys.argv[1]
-except (IndexError) :
-	print("Please insert the CoNLL-U files you want to analyse, either as a single document, a folder path, or an orderly comma-separated list of file/paths (can be mixed).")
-	quit()
-	
-#Hardcoded CoNNL-U extension, but the code might possibly include Plus, too
+#Hardcoded CoNNL-U extension, but the code might possibly include Plus, too; compressed documents are also read (see CoNLLUTools.openCoNLLU)
 extensions = ('.conllu',)
+extensions += tuple(e+c for e in extensions for c in CoNLLUTools.compressions)
 
-#Extraction of documents
-texts = []
-for doc in folder.strip().split(',') :
-	if os.path.isdir(doc) :
-		for t , _, fili in os.walk(doc) :
-			texts.extend([os.path.join(t,f) for f in fili if os.path.splitext(f)[1]  in extensions ])
-	else : 
-		if os.path.splitext(doc)[1] in extensions :
-			texts.append(doc)	
-#
-
-#Creation of output name
-from pathlib import Path
-output = 'ADV_' + '_'.join(map(lambda x : Path(x).stem,texts))
-if not os.path.exists(output):
-    os.makedirs(output)
-
-#Specific named tuples to handle adverbs
-ADV = namedtuple('ADV','form lemma pos morpho deprel head ddeprel') 
-ADV.__new__.__defaults__ = ('','_','ADV','','',None,(),(),None,None,None,None)#*len(ADV._fields)
-
-#Lits which will be used
-adverbs = []
-adverbials = []
-forms = set() 
-obliques = []
-advcoord = []
-
-#Definitions of relations classes we need, hardcoded from UD tools 
+#Definitions of relations classes we need, hardcoded from UD tools
 alldeprel = {'acl','advcl','advmod','amod','appos','aux','case','cc','ccomp','clf','compound','conj','cop','csubj','dep','det','discourse','dislocated','expl','fixed','flat','goeswith','iobj','list','mark','nmod','nsubj','nummod','obj','obl','orphan','parataxis','punct','reparandum','root','vocative','xcomp'} #taken from UD folder tools/data/deprel.ud, as of v2.14
 clauseheads = {'root','parataxis','csubj','ccomp','xcomp','advcl','acl'} #conj copying the function if it depends on another clause head
 verbfunc = {'aux','cop'}
 roots = {'root','parataxis','acl'}
 horizontal = {'conj','flat','fixed','list'}
 nonrelations = {'dep','orphan','punct','reparandum','goeswith'}
+dependentrels = frozenset(alldeprel - (horizontal | nonrelations)) #meaningful relations for the dependents of an ADV; frozen, as nuclei are memoised by relations
 
-#Collection of data
-for text in texts :
 
-	print(text)
+##Input
+
+#Extraction of documents, from a single document, a folder path, or an orderly comma-separated list of file/paths (can be mixed)
+def collecttexts(folder) :
+
+	texts = []
+	for doc in folder.strip().split(',') :
+		if os.path.isdir(doc) :
+			for t , _, fili in os.walk(doc) :
+				texts.extend([os.path.join(t,f) for f in fili if f.endswith(extensions) ])
+		else :
+			if doc.endswith(extensions) :
+				texts.append(doc)
+
+	return texts
+#
+
+#Name of a document without its extension(s)
+def textstem(text) :
+
+	name = os.path.basename(text)
+	for e in sorted(extensions,key=len,reverse=True) :
+		if name.endswith(e) :
+			return name[:-len(e)]
+	return os.path.splitext(name)[0]
+#
+
+#Name of a group of documents (e.g. a treebank), and creation of its output name
+def groupname(texts) :
+
+	return '_'.join(map(textstem,texts))
+#
+
+def outputname(texts) :
+
+	return 'ADV_' + groupname(texts)
+#
+
+
+##Collection of data
+
+#Index of the analyses (e.g. part of speech, lemma and features) found for every form, as ordered sets, so that all analyses sharing a form are found without scanning all of them
+#Every analysis keeps its rank, i.e. the order in which it has been first added, so that selected analyses can be listed in the same order as the whole index; indices of different documents or treebanks can be merged, provided this happens in their order
+class FormIndex :
+
+	def __init__(self) :
+		self.forms = {}
+		self.size = 0 #total number of analyses, and rank of the next one
+	#
+
+	def __len__(self) :
+		return self.size
+	#
+
+	def __contains__(self,form) :
+		return form in self.forms
+	#
+
+	#Analyses of a form, in order of appearance
+	def analyses(self,form) :
+		return list(self.forms.get(form,()))
+	#
+
+	def add(self,form,analysis) :
+
+		analyses = self.forms.get(form)
+		if analyses is None :
+			analyses = self.forms[form] = {}
+		if analysis not in analyses :
+			analyses[analysis] = self.size
+			self.size += 1
+	#
+
+	#Merging with the index of following documents: new analyses come after all the ones already present
+	def update(self,other) :
+
+		for form, analyses in other.forms.items() :
+			mine = self.forms.get(form)
+			if mine is None :
+				mine = self.forms[form] = {}
+			for analysis, rank in analyses.items() :
+				if analysis not in mine :
+					mine[analysis] = self.size + rank
+		self.size += other.size
+	#
+
+	#The same index, with forms and analyses transformed by given functions
+	def transformed(self,form,analysis) :
+
+		other = FormIndex()
+		other.forms = {form(f):{analysis(a):r for a,r in analyses.items()} for f,analyses in self.forms.items()}
+		other.size = self.size
+		return other
+	#
+
+	#All (form,)+analysis rows for some forms, in the order in which they have been first added
+	def rows(self,forms) :
+
+		rows = [(r,(f,)+a) for f in forms if f in self.forms for a,r in self.forms[f].items()]
+		return [row for _,row in sorted(rows,key=lambda x : x[0])]
+	#
+#
+
+#Index of co-ordinations (e.g. between ADV lemmas): edges are counted as they arrive, and connected components, i.e. groups of co-ordinated members, are kept by means of a union-find structure (with union by size and path halving), so that no graph has to be built
+#Members keep the order in which they have first appeared, and edges the orientation; indices of different documents or processes can be merged, provided this happens in their order
+class CoordinationIndex :
+
+	def __init__(self) :
+		self.parent = {} #also all members, in order of appearance
+		self.size = {} #sizes of components, for their representatives
+		self.edges = Counter() #number of co-ordinations of every couple
+	#
+
+	def __len__(self) :
+		return len(self.parent)
+	#
+
+	#Representative of the component of a member
+	def find(self,x) :
+
+		parent = self.parent
+		while parent[x] != x :
+			parent[x] = parent[parent[x]]
+			x = parent[x]
+		return x
+	#
+
+	def member(self,x) :
+
+		if x not in self.parent :
+			self.parent[x] = x
+			self.size[x] = 1
+	#
+
+	def union(self,x,y) :
+
+		x, y = self.find(x), self.find(y)
+		if x != y :
+			if self.size[x] < self.size[y] :
+				x, y = y, x
+			self.parent[y] = x
+			self.size[x] += self.size.pop(y)
+	#
+
+	def add(self,x,y,count=1) :
+
+		self.member(x)
+		self.member(y)
+		self.edges[(y,x) if (y,x) in self.edges else (x,y)] += count
+		self.union(x,y)
+	#
+
+	#Merging with the index of following documents
+	def update(self,other) :
+
+		for x in other.parent :
+			self.member(x)
+		for (x,y),c in other.edges.items() :
+			self.add(x,y,c)
+	#
+
+	#The same index, with members transformed by a given function
+	def transformed(self,member) :
+
+		other = CoordinationIndex()
+		for x in self.parent :
+			other.member(member(x))
+		for (x,y),c in self.edges.items() :
+			other.add(member(x),member(y),c)
+		return other
+	#
+
+	#Groups of co-ordinated members, each one with the total number of co-ordinations among its members, ranked by decreasing size (or number of co-ordinations), ties keeping the order of appearance; members of a group are in order of appearance
+	def groups(self,weighted=False) :
+
+		groups, weights = {}, Counter()
+		for x in self.parent :
+			groups.setdefault(self.find(x),[]).append(x)
+		for (x,_),c in self.edges.items() :
+			weights[self.find(x)] += c
+
+		return sorted(((members,weights[r]) for r,members in groups.items()),key = lambda x : x[1] if weighted else len(x[0]),reverse=True)
+	#
+#
+
+#Partial aggregates of the data collected from some documents. Aggregates coming from different documents (e.g. from different worker processes) can be merged, provided this happens in the order of the documents, so that the final output does not depend on how the work has been split
+#Forms, lemmas, parts of speech and relations are stored as integer codes of a symbol table (see CoNLLUTools.SymbolTable), which comes with the aggregates; aggregates with different tables are translated when merged, and decoded into strings only for the output
+class ADVaggregates :
+
+	def __init__(self,symbols=None) :
+		self.symbols = CoNLLUTools.SymbolTable() if symbols is None else symbols
+		self.cadv = Counter() #forms over lemmas, because not every treebank has lemmas
+		self.ladv = defaultdict(Counter) #lemmas of every form, with their frequencies; counters keep the order of appearance, so that the order of the output does not depend on hashing
+		self.radv = defaultdict(Counter)
+		self.tadv = defaultdict(Counter)
+		self.dadv = defaultdict(Counter)
+		self.advmorph = set()
+		self.forms = FormIndex() #analyses of non-ADV forms
+		self.posmod = defaultdict(Counter) #absolute counts, normalised only when printing
+		self.advcoord = CoordinationIndex() #co-ordinated ADV lemmas
+	#
+
+	#The profile of an ADV occurrence is added as soon as it is found, so that no list of occurrences has to be kept
+	def addadverb(self,form,lemma,morpho,deprel,head,ddeprel) :
+
+		self.cadv[form] += 1
+		self.ladv[form][lemma] += 1
+		self.radv[form][deprel] += 1
+		self.tadv[form][self.symbols.code('PRED' if head in ('ADJ','DET','NUM','ADV') else head)] += 1 #We conflate into the PRED macrocategory also all modifiers
+		for d in ddeprel :
+			self.dadv[form][self.symbols.code(d)] += 1
+		self.advmorph.update(morpho.split('|'))
+	#
+
+	#Any element tagged with an adverbial relation
+	def addadverbial(self,pos,lemma) :
+
+		self.posmod[pos][lemma] += 1
+	#
+
+	#Merging with the aggregates of following documents
+	def update(self,other) :
+
+		if other.symbols is not self.symbols :
+			other = other.recoded(self.symbols.encode(other.symbols.strings),self.symbols)
+
+		self.cadv.update(other.cadv)
+		for counts, othercounts in ((self.ladv,other.ladv),(self.radv,other.radv),(self.tadv,other.tadv),(self.dadv,other.dadv),(self.posmod,other.posmod)) :
+			for k,c in othercounts.items() :
+				counts[k].update(c)
+		self.advmorph |= other.advmorph
+		self.forms.update(other.forms)
+		self.advcoord.update(other.advcoord)
+	#
+
+	#The same aggregates, with codes translated by means of a sequence (i.e. the codes of another symbol table, or the strings themselves)
+	def recoded(self,translation,symbols=None) :
+
+		t = translation
+		other = ADVaggregates(symbols)
+		other.cadv = Counter({t[f]:c for f,c in self.cadv.items()})
+		other.ladv, other.radv, other.tadv, other.dadv, other.posmod = (defaultdict(Counter,{t[k]:Counter({t[j]:c for j,c in counts.items()}) for k,counts in aggregate.items()}) for aggregate in (self.ladv,self.radv,self.tadv,self.dadv,self.posmod))
+		other.advmorph = set(self.advmorph)
+		other.forms = self.forms.transformed(t.__getitem__,lambda a : (t[a[0]],t[a[1]],a[2]))
+		other.advcoord = self.advcoord.transformed(t.__getitem__)
+		return other
+	#
+
+	#Non-ADV analyses (part of speech, lemma, features) sharing a form, as strings
+	def analyses(self,form) :
+
+		code, strings = self.symbols.index.get(form.lower()), self.symbols.strings
+		return [(strings[u],strings[l],m) for u,l,m in self.forms.analyses(code)]
+	#
+
+	#The same aggregates, with strings instead of codes, for the output
+	def decoded(self) :
+
+		return self.recoded(self.symbols.strings)
+	#
+
+	#Attributes as plain data, the indices being replaced by their own attributes, so that they can be stored and read back whether this module runs as a script or is imported (see restored)
+	def stored(self) :
+
+		state = dict(vars(self))
+		state['forms'], state['advcoord'] = vars(self.forms), vars(self.advcoord)
+		return state
+	#
+#
+
+#Instrumentation of the collection of data: time spent in every phase (e.g. parsing, tree walks, nucleus extraction, aggregation, writing of every table) and number of times it has been entered, together with the sentences and tokens which have been read
+#Profiles of different documents or processes can be merged; progress is displayed at most once per interval (in seconds), on a single line of a terminal only, so that logs are not filled with it
+class Profile :
+
+	def __init__(self,interval=1.0) :
+		self.seconds = Counter()
+		self.calls = Counter()
+		self.sentences = 0
+		self.tokens = 0
+		self.wall = 0.0 #overall time, which might be less than the sum of all phases if these were run in parallel
+		self.interval = interval
+		self.started = self.shown = self.last = time.perf_counter()
+		self.width = 0 #length of the progress line being displayed, if any
+	#
+
+	def add(self,phase,seconds,calls=1) :
+
+		self.seconds[phase] += seconds
+		self.calls[phase] += calls
+	#
+
+	#Time passed since the last lap is added to a phase (if any), e.g. when phases follow each other in a block of code
+	def lap(self,phase=None) :
+
+		now = time.perf_counter()
+		if phase :
+			self.add(phase,now-self.last)
+		self.last = now
+	#
+
+	#Time spent to get every element of an iterable, e.g. to parse every tree
+	def timed(self,iterable,phase) :
+
+		iterator = iter(iterable)
+		while True :
+			start = time.perf_counter()
+			try :
+				element = next(iterator)
+			except (StopIteration) :
+				self.add(phase,time.perf_counter()-start,0)
+				return
+			self.add(phase,time.perf_counter()-start)
+			yield element
+	#
+
+	#A sentence with its tokens has been read; progress is shown if enough time has passed since the last time
+	def progress(self,sentence,tokens) :
+
+		self.sentences += 1
+		self.tokens += tokens
+		now = time.perf_counter()
+		if now - self.shown >= self.interval and sys.stderr.isatty() :
+			self.shown = now
+			line = '{}: {} sentences, {:.0f} tokens/s'.format(sentence,self.sentences,self.tokens/(now-self.started))
+			print(line.ljust(self.width),end='\r',file=sys.stderr,flush=True)
+			self.width = len(line)
+	#
+
+	#The progress line is wiped out (e.g. at the end of a document), so that what follows is not printed over it
+	def clearprogress(self) :
+
+		if self.width :
+			print(' '*self.width,end='\r',file=sys.stderr,flush=True)
+			self.width = 0
+	#
+
+	def update(self,other) :
+
+		self.seconds.update(other.seconds)
+		self.calls.update(other.calls)
+		self.sentences += other.sentences
+		self.tokens += other.tokens
+		self.wall += other.wall
+	#
+
+	#Summary with rates per second, and time and calls per phase
+	def record(self) :
+
+		return {'sentences' : self.sentences,\
+				'tokens' : self.tokens,\
+				'seconds' : round(self.wall,6),\
+				'sentences_per_second' : round(self.sentences/self.wall) if self.wall else None,\
+				'tokens_per_second' : round(self.tokens/self.wall) if self.wall else None,\
+				'phases' : {p:{'seconds' : round(t,6), 'calls' : self.calls[p]} for p,t in self.seconds.items()}}
+	#
+#
+
+#Report of the profiles of single documents and of the whole run, as JSON or, if the file ends in .tsv, as a table with a column of seconds for every phase
+def writeprofile(path,profile,documents={}) :
+
+	import json
+
+	records = {text:p.record() for text,p in documents.items()}
+	records['total'] = profile.record()
+
+	with open(path,'w',encoding='utf8') as report :
+		if not path.endswith('.tsv') :
+			json.dump(records,report,indent=1)
+			return
+		phases = list(dict.fromkeys(p for r in records.values() for p in r['phases']))
+		report.write('Document\tSentences\tTokens\tSeconds\tSentences/s\tTokens/s\t{}\n'.format('\t'.join(phases)))
+		for text,r in records.items() :
+			report.write('{}\n'.format('\t'.join([text] + [str(r[k]) for k in ('sentences','tokens','seconds','sentences_per_second','tokens_per_second')] + [str(r['phases'][p]['seconds'] if p in r['phases'] else 0) for p in phases])))
+#
+
+#Collection of data from sentences with their (compact) trees, as given by CoNLLUTools.readCoNLLU, encoded by means of the symbol table of the aggregates
+#Time spent in the different phases is added to a profile
+def extractsentences(sentences,aggregates,profile) :
+
+	#Aggregates are updated while tokens are visited, so that memory does not grow with the size of the document
+	strings, lowered, based = aggregates.symbols.strings, aggregates.symbols.lowered, aggregates.symbols.based
+	clock, seconds, calls = time.perf_counter, profile.seconds, profile.calls
+	start = clock()
+
+	for s,a in profile.timed(sentences,'parse') :
+
+		forms, lemmas, upos, deprels = (a.codes[f] for f in ('form','lemma','upos','deprel'))
+		words = 0
 
-	for s,a in CoNLLUTools.readCoNLLU(text) :
-		
-		print(s['sent_id'],end='\r')
-		
 		for n in CoNLLUTools.syntacticwords(a) :
-			
+
+			p = a.positions[n.id]
+			words += 1
+
 			#We act modulo horizontal (i.e. co-ordinative) structures
+			t = clock()
 			tnode = CoNLLUTools.truehead(a,n.id,conj=horizontal)
-			trel = tnode.deprel.split(':')[0] #no subtypes
+			seconds['tree walk'] += clock() - t
+			trel = based[deprels[a.positions[tnode.id]]] #no subtypes
 			thead = tnode.head
-			
-			if n.upos == 'ADV' and trel not in nonrelations : 
-				
+
+			if n.upos == 'ADV' and strings[trel] not in nonrelations :
+
 				#Basic features
-				adv = ADV(form = n.form.lower(), lemma = n.lemma.lower(), morpho = CoNLLUTools.writeUDfeatures(n.feats), deprel = tnode.deprel.split(':')[0])
-				
+				form, lemma, morpho = lowered[forms[p]], lowered[lemmas[p]], CoNLLUTools.writeUDfeatures(n.feats)
+
 				#If it the ADV is not the head of a predicate, we fetch some context...
 				if tnode.deprel not in clauseheads :
 
 					#We consider the (true) head of the node
-					hnode = a.nodes[thead]['features']
+					hnode = CoNLLUTools.getnode(a,thead)
+					t = clock()
 					hnucleus = CoNLLUTools.extractnucleus(a,hnode.id)
-					
+					seconds['nucleus'] += clock() - t
+					calls['nucleus'] += 1
+					hp = a.positions[hnode.id]
+
 					#We define some macrocategories for the head of the ADV: PRED for a (synthetic or periphrastic) predication, NOM for nominals
-					hpos = 'PRED' if (hnode.deprel.split(':')[0] in clauseheads or hnode.upos in ('VERB','AUX') or {'cop','aux'}.intersection(hnucleus.deprels)) else hnode.upos
-					hpos = 'NOM' if hpos in ('NOUN','PROPN','PRON') else hpos 
-					
-					#We collect the data about the ADV head and syntactic distances
-					adv = adv._replace(head = hpos)		
-					
+					hpos = 'PRED' if (strings[based[deprels[hp]]] in clauseheads or hnode.upos in ('VERB','AUX') or {'cop','aux'}.intersection(hnucleus.deprels)) else hnode.upos
+					hpos = 'NOM' if hpos in ('NOUN','PROPN','PRON') else hpos
+
 					#Co-ordinated ADVs
-					if n.deprel.split(':')[0] == 'conj' and hnode.upos == 'ADV' :
-						advcoord.append((n.lemma.lower(), hnode.lemma.lower()))
-					
+					if strings[based[deprels[p]]] == 'conj' and hnode.upos == 'ADV' :
+						aggregates.advcoord.add(lemma, lowered[lemmas[hp]])
+
 				else : #The ADV is itself the head of a clause
-					adv = adv._replace(head = 'ROOT') 
-					
+					hpos = 'ROOT'
+
 				#We collect information about possible ADV's dependents	with meaningful relations #In horizontal constructions, we look only at "local dependents", not at possible common dependents of the whole construction
-				adv = adv._replace(ddeprel = tuple(sorted(CoNLLUTools.extractnucleus(a,n.id,funcrel = alldeprel - (horizontal | nonrelations)).deprels))) #ddeprel = tuple(sorted([a.nodes[nn]['features'].deprel for nn in a.successors(tnode.id) if not a.nodes[nn]['features'].deprel.startswith(horizontal+('punct',)) and a.nodes[nn]['features'].id != n.id]))
-				
-				#We add the ADV profile we have so found to the list
-				adverbs.append(adv)
+				t = clock()
+				ddeprel = tuple(sorted(CoNLLUTools.extractnucleus(a,n.id,funcrel = dependentrels).deprels))
+				seconds['nucleus'] += clock() - t
+				calls['nucleus'] += 1 #ddeprel = tuple(sorted([a.nodes[nn]['features'].deprel for nn in a.successors(tnode.id) if not a.nodes[nn]['features'].deprel.startswith(horizontal+('punct',)) and a.nodes[nn]['features'].id != n.id]))
+
+				#We add the ADV profile we have so found to the aggregates
+				t = clock()
+				aggregates.addadverb(form,lemma,morpho,trel,hpos,ddeprel)
+				seconds['aggregation'] += clock() - t
 				#
-				
-					
+
+
 			#We save all forms of non-ADV elements to compare them with ADVs
 			elif n.upos != 'ADV' :
-				forms.add((n.form.lower(), n.upos, n.lemma.lower(), CoNLLUTools.writeUDfeatures(n.feats)))
-				
+				t = clock()
+				aggregates.forms.add(lowered[forms[p]], (upos[p], lowered[lemmas[p]], CoNLLUTools.writeUDfeatures(n.feats)))
+				seconds['aggregation'] += clock() - t
+
 			#We save any other elements tagged with adverbial relations
-			if tnode.deprel.split(':')[0] == 'advmod' :		
-				adverbials.append(ADV(form = n.form.lower(), lemma = n.lemma.lower(), pos=n.upos, morpho = CoNLLUTools.writeUDfeatures(n.feats), deprel = tnode.deprel.split(':')[0]))
+			if strings[trel] == 'advmod' :
+				aggregates.addadverbial(upos[p],lowered[lemmas[p]])
+
+		calls['tree walk'] += words
+		calls['aggregation'] += words
+		profile.progress(s.get('sent_id'),words)
+	#
+
+	profile.wall += clock() - start
+	profile.clearprogress()
+
+	return aggregates
 #
 
-	
-#We prepare and lay out the data collected so far
-cadv = Counter(ad.form for ad in adverbs) #forms over lemmas, because not every treebank has lemmas
+#Collection of data from a single document, together with its profile
+#Parsed documents can be cached (see CoNLLUTools.readCoNLLU)
+def extractfile(text,cache=None) :
+
+	print(text)
+
+	aggregates, profile = ADVaggregates(), Profile()
+	return extractsentences(CoNLLUTools.readCoNLLU(text,compact=True,cache=cache,symbols=aggregates.symbols),aggregates,profile), profile
 #
-ladv = defaultdict(set)
-for ad in adverbs :
-	ladv[ad.form].add(ad.lemma)
+
+#Units of work for worker processes, tagged with the position of their document: whole documents, or batches of sentences as raw text
+def extractindexedfile(task,cache=None) :
+
+	i, text = task
+	return (i,) + extractfile(text,cache=cache)
 #
-radv = defaultdict(Counter)
-for ad in adverbs :
-	radv[ad.form][ad.deprel] += 1
-#	
-tadv = defaultdict(Counter)
-for ad in adverbs :
-	tadv[ad.form]['PRED' if ad.head in ('ADJ','DET','NUM','ADV') else ad.head] += 1 #We conflate into the PRED macrocategory also all modifiers
+
+def extractbatch(task) :
+
+	import io
+
+	i, raw = task
+	aggregates, profile = ADVaggregates(), Profile()
+	return i, extractsentences(CoNLLUTools.readCoNLLU(io.StringIO(raw),compact=True,symbols=aggregates.symbols),aggregates,profile), profile
 #
-dadv = defaultdict(Counter)
-for ad in adverbs :
-	for d in ad.ddeprel :
-		dadv[ad.form][d] += 1
+
+#Batches of sentences of all documents, as raw text, read lazily
+def textbatches(texts,size) :
+
+	for i,text in enumerate(texts) :
+		print(text)
+		for raw in CoNLLUTools.rawCoNLLUbatches(text,size) :
+			yield i, raw
 #
 
-	
-#General distribution of ADV types	
-with open(os.path.join(output,'ADV_distr.tsv'),'w',encoding='utf8') as advex :
+#Shards of a given number of sentences of all documents, as byte ranges given by their sentence index (see CoNLLUTools.SentenceIndex), so that every one of them is read on its own; the shards of every document which have already been done are skipped
+#Compressed documents, which cannot be indexed, are a single shard; the number of shards of every document is recorded in totals, as soon as it is known
+def textshards(texts,size,resumed,totals) :
 
-	modified = sorted(filter(None,set().union(*[t.keys() for _,t in tadv.items()]))) #All UPOS appearing as heads of an ADV
-	
-	advex.write('Form type\tLemmas\tFrequency\t{}\n'.format('\t'.join(modified)))
-	
-	for dv in cadv : 
-		
-		advex.write('{}\t{}\t{}\t{}\n'.format( dv,\
-												  ','.join(ladv[dv]),\
-												  str(cadv[dv]),\
-												  '\t'.join(str(tadv[dv].get(t,0)/cadv[dv]) for t in modified),\
-												 ))	
+	for i,text in enumerate(texts) :
+		print(text)
+		shards = [None] if text.endswith(CoNLLUTools.compressions) else CoNLLUTools.SentenceIndex(text).shards(size)
+		totals[i] = len(shards)
+		for shard in shards[resumed[i]:] :
+			yield i, text, shard
 #
 
-#We investigate ADV form types coinciding with forms of other parts of speech	 			 
-coincidences = {a.form for a in adverbs} & {f[0] for f in forms}
+def extractshard(task) :
 
-with open(os.path.join(output,'ADV_coinc.tsv'),'w',encoding='utf8') as advex :
-	for fc in [f for f in forms if f[0] in coincidences] :
-		advex.write('{}\n'.format('\t'.join(fc)))
+	i, text, shard = task
+	aggregates, profile = ADVaggregates(), Profile()
+	if shard is None :
+		sentences = CoNLLUTools.readCoNLLU(text,compact=True,symbols=aggregates.symbols)
+	else :
+		sentences = CoNLLUTools.readCoNLLUrange(text,*shard,compact=True,symbols=aggregates.symbols)
+	return i, extractsentences(sentences,aggregates,profile), profile
 #
 
-#We investigate nominal-like dependents of ADVs
-dnom = ('nmod', 'appos', 'nummod', 'acl', 'amod', 'det', 'clf', 'case', 'cop') #nominal dependents + the copula, which implies the ADV is not metapredicating
+#Results of a function applied to tasks by a pool of processes, in the order of the tasks; only a limited number of tasks is submitted at a time, so that tasks can be read lazily (e.g. from a large document)
+def orderedmap(pool,function,tasks,window) :
 
-nomdependents = defaultdict(dict)
-nominallike = set()
-threshold = 5 #we want to avoid noise and find some regular patterns
+	from collections import deque
+
+	pending = deque()
+	for task in tasks :
+		pending.append(pool.apply_async(function,(task,)))
+		if len(pending) >= window :
+			yield pending.popleft().get()
+	while pending :
+		yield pending.popleft().get()
+#
 
-for adv,ddiz in dadv.items() :
-	for dr,dc in ddiz.items() :
-		if dr.startswith(dnom) and cadv[adv] > threshold : 
-			nomdependents[dr][adv] = dc/cadv[adv]
-			nominallike.add(adv)
+#Partial aggregates of single documents can be stored in a folder, keyed by the content hash of the document, so that only documents which have changed have to be processed again
+#The version has to be increased whenever the collection of data changes, so that stored aggregates are not reused
+PARTIALSVERSION = 7
 
-with open(os.path.join(output,'ADV_nominals.tsv'),'w',encoding='utf8') as advex :
-	for d in nomdependents :
-		advex.write('{}\t{}\n\n'.format(d, ' '.join(['/'.join(map(str,i)) for i in sorted(nomdependents[d].items(), key = lambda x : x[1], reverse=True)])  ))
+#Path of the stored aggregates of a document
+def partialpath(partials,text) :
+
+	return os.path.join(partials,'{}_{}.pickle'.format(CoNLLUTools.stringhash(os.path.abspath(text))[:16],os.path.basename(text)))
 #
 
-#We print ADVs having a form different from the lemma
-difforms = defaultdict(lambda : defaultdict(set))
+#The key under which the aggregates of a document are stored
+def partialkey(text) :
 
-#The transformation in terms of prefixoid and suffixoid substitution to go from A to B is found
-def findstringtransformation(AB) : 
-	import difflib
-	from collections import namedtuple
-	A,B = AB
-	Transformation = namedtuple('Transformation', 'Apref Bpref Asuff Bsuff') 
-	Transformation.__new__.__defaults__ = ('','','','')
-	commons = difflib.SequenceMatcher(None, A, B).find_longest_match(0,len(A),0,len(B))
-	return Transformation(len(A[:commons.a]),B[:commons.b],len(A[commons.a+commons.size:]),B[commons.b+commons.size:]) 
+	return {'path' : os.path.abspath(text), 'size' : os.path.getsize(text), 'hash' : CoNLLUTools.filehash(text), 'version' : PARTIALSVERSION}
+#
+
+#A stored key with its state, or (None,None) if absent or unreadable (e.g. written by an older version, referring to classes which are no longer there)
+def loadstored(path) :
+
+	import pickle
+
+	try :
+		with open(path,'rb') as stored :
+			return pickle.load(stored)
+	except (OSError, EOFError, pickle.UnpicklingError, ValueError, AttributeError, ImportError) :
+		return None, None
+#
+
+#States are written to a temporary file first, so that an interrupted run never leaves a truncated one
+def savestored(path,key,state) :
+
+	import pickle
+
+	os.makedirs(os.path.dirname(path),exist_ok=True)
+	with open(path + '.tmp','wb') as stored :
+		pickle.dump((key,state),stored,protocol=pickle.HIGHEST_PROTOCOL)
+	os.replace(path + '.tmp',path)
+#
+
+#Aggregates from their stored attributes (see ADVaggregates.stored)
+def restored(state) :
+
+	aggregates = ADVaggregates()
+	vars(aggregates).update(state)
+	aggregates.forms, aggregates.advcoord = FormIndex(), CoordinationIndex()
+	vars(aggregates.forms).update(state['forms'])
+	vars(aggregates.advcoord).update(state['advcoord'])
+	return aggregates
+#
+
+#Stored aggregates of a document, or None if they are absent or out of date
+def loadpartial(partials,text) :
+
+	key, state = loadstored(partialpath(partials,text))
+	if key is None or key != partialkey(text) :
+		return None
+
+	return restored(state)
+#
+
+def savepartial(partials,text,aggregates) :
+
+	savestored(partialpath(partials,text),partialkey(text),aggregates.stored())
+#
+
+#Documents processed in shards (see textshards) have checkpoints, where their aggregates are stored after every shard together with the number of shards done, so that an interrupted run resumes from the last one
+#Checkpoints are keyed as partial aggregates, and by the size of shards; they are removed once their document is complete
+def checkpointpath(checkpoints,text) :
+
+	return os.path.splitext(partialpath(checkpoints,text))[0] + '.checkpoint'
+#
+
+def checkpointkey(text,size) :
+
+	return dict(partialkey(text),shards=size)
+#
+
+#Number of shards done and their aggregates, or (0,None) if there is no valid checkpoint
+def loadcheckpoint(checkpoints,text,key) :
+
+	stored, state = loadstored(checkpointpath(checkpoints,text))
+	if stored is None or stored != key :
+		return 0, None
+
+	done, state = state
+	return done, restored(state)
+#
+
+def savecheckpoint(checkpoints,text,key,done,aggregates) :
+
+	savestored(checkpointpath(checkpoints,text),key,(done,aggregates.stored()))
+#
+
+#Collection of data from all documents, possibly distributed over several processes, each one treating a whole document, a batch of sentences of a given size, or a shard of a given number of sentences (even with a single process)
+#The partial aggregates of every document are given in the order of the documents, those of its batches or shards being merged in their order, so that the output is the same as with a single process
+#If a folder for partial aggregates is given, only the documents without valid stored aggregates are processed
+#If a folder for checkpoints is given, documents processed in shards resume from their last checkpoint (shards are not cached); checkpoints are saved at most once per interval (in seconds), as all aggregates of the document are stored every time, and after the last shard
+#The profiles of the documents which have been processed can be collected in a dictionary
+def extractdocuments(texts,jobs=1,cache=None,partials=None,batch=None,shards=None,checkpoints=None,interval=60.0,profiles=None) :
+
+	from functools import partial
+
+	stored = [loadpartial(partials,text) if partials else None for text in texts]
+	missing = [text for text,p in zip(texts,stored) if p is None]
+
+	checkpoints = checkpoints if shards else None
+	keys = [checkpointkey(text,shards) if checkpoints else None for text in missing]
+	resumed = [loadcheckpoint(checkpoints,text,key) if checkpoints else (0,None) for text,key in zip(missing,keys)]
+
+	pool = None
+	if jobs > 1 and (len(missing) > 1 or ((batch or shards) and missing)) :
+		from multiprocessing import Pool
+		pool = Pool(jobs if batch or shards else min(jobs,len(missing)))
+
+	totals = {} #number of shards of every document
+	if shards :
+		tasks, function = textshards(missing,shards,[r for r,_ in resumed],totals), extractshard
+	elif pool and batch :
+		tasks, function = textbatches(missing,batch), extractbatch
+	else :
+		tasks, function = enumerate(missing), partial(extractindexedfile,cache=cache)
+	computed = orderedmap(pool,function,tasks,2*jobs) if pool else map(function,tasks)
+
+	try :
+		done = next(computed,None)
+		m = 0 #position among missing documents
+		for text, partialaggregates in zip(texts,stored) :
+			if partialaggregates is None :
+				profile = Profile()
+				shard, partialaggregates = resumed[m]
+				saved = time.perf_counter()
+				while done is not None and done[0] == m : #results for the same document
+					if partialaggregates is None :
+						partialaggregates = done[1]
+					else :
+						partialaggregates.update(done[1])
+					profile.update(done[2])
+					shard += 1
+					if checkpoints and (shard == totals.get(m) or time.perf_counter() - saved >= interval) : #before waiting for the next shard, so that none which has been merged is lost
+						savecheckpoint(checkpoints,text,keys[m],shard,partialaggregates)
+						saved = time.perf_counter()
+					done = next(computed,None)
+				if profiles is not None :
+					profiles[text] = profile
+				partialaggregates = ADVaggregates() if partialaggregates is None else partialaggregates
+				if partials :
+					savepartial(partials,text,partialaggregates)
+				if checkpoints and os.path.exists(checkpointpath(checkpoints,text)) :
+					os.remove(checkpointpath(checkpoints,text))
+				m += 1
+			yield text, partialaggregates
+	finally :
+		if pool :
+			pool.terminate()
 #
 
-for af,al in ladv.items() :
-	for aall in set(map(str.lower,al)) - {af.lower()} :
-		difforms['|'.join(map(str,findstringtransformation((aall,af.lower()))))][af.lower()].add(aall)
-		
-with open(os.path.join(output,'ADV_difflemma.tsv'),'w',encoding='utf8') as advex :
-	for df,fl in difforms.items() :
-		for f,ll in fl.items() : 
-			advex.write('{}\t{}\t{}\n'.format( df, f, ','.join(ll) ))
+#Aggregates of all documents, merged in their order (see extractdocuments for the options)
+def extract(texts,**options) :
+
+	aggregates = ADVaggregates()
+	for _, partialaggregates in extractdocuments(texts,**options) :
+		aggregates.update(partialaggregates)
+
+	return aggregates
 #
-		  
-#We print all morpholexical properties associated to ADVs
-advmorph = set().union(*[adv.morpho.split('|') for adv in adverbs])
 
-with open(os.path.join(output,'ADV_morpho.tsv'),'w',encoding='utf8') as advex :
-	for m in sorted(advmorph) :
-		advex.write('{}\n'.format(m))
+
+##Output
+
+#Transformation in terms of prefixoid and suffixoid substitution to go from a string A to a string B: the number of characters to delete from each side of A, and the strings to add instead, around the longest substring they have in common
+Transformation = namedtuple('Transformation', 'Apref Bpref Asuff Bsuff')
+Transformation.__new__.__defaults__ = ('','','','')
+
+#Engine finding transformations, with a cache of the results for each couple (A,B) of strings
+#Couples can be treated in batches, where the second string B (the form, for ADVs) is analysed only once for all the As (the lemmas) it is compared to
+#The longest common substring is found either by difflib (method='difflib'), or by a suffix automaton of B (method='automaton'), which gives the same result: among longest common substrings, the one starting first in A, and then first in B
+class TransformationEngine :
+
+	def __init__(self,method='difflib') :
+
+		if method not in ('difflib','automaton') :
+			raise Exception('Unknown method for string transformations: {}.'.format(method))
+		self.method = method
+		self.cache = {}
+	#
+
+	def transform(self,A,B) :
+
+		return self.transformall([(A,B)])[0]
+	#
+
+	def transformall(self,couples) :
+
+		couples = list(couples)
+
+		missing = defaultdict(dict)
+		for A,B in couples :
+			if (A,B) not in self.cache :
+				missing[B][A] = None
+
+		for B,As in missing.items() :
+			match = self.matcher(B)
+			for A in As :
+				a, b, size = match(A)
+				self.cache[(A,B)] = Transformation(len(A[:a]),B[:b],len(A[a+size:]),B[b+size:])
+
+		return [self.cache[c] for c in couples]
+	#
+
+	#A function giving the longest match (a,b,size) of any string with B
+	def matcher(self,B) :
+
+		if self.method == 'automaton' and len(B) < 200 : #for longer strings, difflib may treat popular characters as junk, so that results could differ
+			return suffixautomatonmatcher(B)
+
+		sm = difflib.SequenceMatcher(None)
+		sm.set_seq2(B)
+		def match(A) :
+			sm.set_seq1(A)
+			return tuple(sm.find_longest_match(0,len(A),0,len(B)))
+		return match
+	#
+#
+
+#Longest match of any string A with B by means of the suffix automaton of B, in linear time
+#Every state of the automaton stands for the substrings of B with the same end positions, and keeps the first one of them; A is read through the automaton, keeping the longest substring of B ending at each position of A
+#Only a strictly longer match replaces the best one, so that this starts first in A, as in difflib; its first occurrence in B is found in the state of the match, i.e. going back along suffix links as long as they still contain it
+#If there is no match at all, (0,0,0) is returned, as in difflib
+def suffixautomatonmatcher(B) :
+
+	length, link, transitions, firstend = [0], [-1], [{}], [-1]
+	last = 0
+
+	for i,c in enumerate(B) :
+		current = len(length)
+		length.append(length[last]+1)
+		link.append(0)
+		transitions.append({})
+		firstend.append(i)
+		p = last
+		while p != -1 and c not in transitions[p] :
+			transitions[p][c] = current
+			p = link[p]
+		if p != -1 :
+			q = transitions[p][c]
+			if length[p] + 1 == length[q] :
+				link[current] = q
+			else :
+				clone = len(length)
+				length.append(length[p]+1)
+				link.append(link[q])
+				transitions.append(dict(transitions[q]))
+				firstend.append(firstend[q])
+				while p != -1 and transitions[p].get(c) == q :
+					transitions[p][c] = clone
+					p = link[p]
+				link[q] = clone
+				link[current] = clone
+		last = current
+	#
+
+	def match(A) :
+
+		state, size = 0, 0
+		best = (0,0,0)
+
+		for i,c in enumerate(A) :
+			while state and c not in transitions[state] :
+				state = link[state]
+				size = length[state]
+			if c in transitions[state] :
+				state = transitions[state][c]
+				size += 1
+			if size > best[2] :
+				s = state
+				while link[s] > 0 and length[link[s]] >= size :
+					s = link[s]
+				best = (i-size+1,firstend[s]-size+1,size)
+
+		return best
+	#
+
+	return match
 #
 
+#Default engine, used by findstringtransformation
+transformationengine = TransformationEngine()
 
-#Overview of what takes the relation advmod
+#The transformation in terms of prefixoid and suffixoid substitution to go from A to B is found
+def findstringtransformation(AB) :
+	return transformationengine.transform(*AB)
+#
 
-##Outputs a Counter with normalised counts 
-def counternormalisation(c) : 
-	from collections import Counter
+##Outputs a Counter with normalised counts
+def counternormalisation(c) :
 	nc = {}
 	total = sum(c.values())
 	for x,n in c.items() :
@@ -226,36 +861,263 @@ def counternormalisation(c) :
 	return nc
 #
 
-advmodcont = counternormalisation(Counter([adv.pos for adv in adverbials]))
+#Normalised counts of lemmas for every part of speech, and of parts of speech overall, sorted by decreasing frequency, ties keeping the order of appearance
+def advmoddistributions(posmod) :
+
+	advmodcont = counternormalisation(Counter({p:sum(cmod.values()) for p,cmod in posmod.items()}))
+	advmodcont = sorted(advmodcont.items(),key = lambda x :x[1],reverse=True)
+	posmod = {p:sorted(counternormalisation(cmod).items(),key=lambda x : x[1],reverse=True) for p,cmod in posmod.items()}
+
+	return advmodcont, posmod
+#
+
+
+##Vectorised computation of the normalised tables, with NumPy, giving exactly the same numbers (integer counts are exact as floats, and divisions are correctly rounded in both cases)
+
+#Distribution of ADV types over head categories: a form × category matrix of counts, built from integer codes of forms and categories, is normalised at once by the frequencies of forms
+def distributionsnumpy(cadv,tadv,modified) :
+
+	import numpy
+
+	formindex = {f:i for i,f in enumerate(cadv)}
+	catindex = {t:j for j,t in enumerate(modified)}
+
+	counts = numpy.zeros((len(formindex),len(catindex)))
+	cells = numpy.array([(formindex[f],catindex[t],c) for f,tc in tadv.items() for t,c in tc.items() if t in catindex],dtype=numpy.int64).reshape(-1,3)
+	counts[cells[:,0],cells[:,1]] = cells[:,2]
+	frequencies = numpy.fromiter(cadv.values(),dtype=numpy.float64,count=len(cadv))
+
+	return (counts / frequencies[:,None]).tolist()
+#
+
+#The same as advmoddistributions: all counters are laid out as a single sparse part of speech × lemma matrix (i.e. one segment per part of speech), which is normalised and sorted at once
+def advmoddistributionsnumpy(posmod) :
+
+	import numpy
+
+	pos = list(posmod)
+	lemmas = [l for p in pos for l in posmod[p]]
+	counts = numpy.fromiter((c for p in pos for c in posmod[p].values()),dtype=numpy.float64,count=len(lemmas))
+	segments = numpy.repeat(numpy.arange(len(pos)),[len(posmod[p]) for p in pos])
+
+	totals = numpy.bincount(segments,weights=counts,minlength=len(pos))
+	values = counts / totals[segments]
+	order = numpy.lexsort((-values,segments)) #by part of speech, then by decreasing value; sorting is stable
+
+	shares = totals / totals.sum() if len(pos) else totals
+	ranking = numpy.argsort(-shares,kind='stable')
+	advmodcont = list(zip([pos[i] for i in ranking.tolist()],shares[ranking].tolist()))
+
+	distributions = {p:[] for p in pos}
+	for i,p,v in zip(order.tolist(),segments[order].tolist(),values[order].tolist()) :
+		distributions[pos[p]].append((lemmas[i],v))
+
+	return advmodcont, distributions
+#
+
+
+#We lay out the data collected so far in the output folder
+#Normalised tables can be computed with NumPy (vectorised=True), with the same results; a specific engine for string transformations can be given
+#The time needed for every table is added to a profile, if given
+def writetables(aggregates,output,vectorised=False,engine=None,profile=None) :
+
+	profile = Profile() if profile is None else profile
+	profile.lap()
+
+	aggregates = aggregates.decoded()
+	profile.lap('decoding')
+	cadv, ladv, tadv, dadv = aggregates.cadv, aggregates.ladv, aggregates.tadv, aggregates.dadv
+	forms = aggregates.forms
+
+	#General distribution of ADV types
+	with open(os.path.join(output,'ADV_distr.tsv'),'w',encoding='utf8') as advex :
+
+		modified = sorted(filter(None,set().union(*[t.keys() for _,t in tadv.items()]))) #All UPOS appearing as heads of an ADV
+
+		advex.write('Form type\tLemmas\tFrequency\t{}\n'.format('\t'.join(modified)))
+
+		distributions = distributionsnumpy(cadv,tadv,modified) if vectorised else ([tadv[dv].get(t,0)/cadv[dv] for t in modified] for dv in cadv)
 
-posmod = defaultdict(Counter)
-for adv in adverbials :
-	posmod[adv.pos][adv.lemma] += 1
-posmod = {p:counternormalisation(cmod) for p,cmod in posmod.items()}
+		advex.writelines('{}\t{}\t{}\t{}\n'.format( dv,\
+													  ','.join(ladv[dv]),\
+													  str(cadv[dv]),\
+													  '\t'.join(map(str,distribution)),\
+													 ) for dv,distribution in zip(cadv,distributions))
+	profile.lap('ADV_distr.tsv')
+	#
 
-with open(os.path.join(output,'ADV_advmod.tsv'),'w',encoding='utf8') as advex :
-	
-	advex.write('{}\n\n\n'.format('\n'.join(['\t'.join(map(str,c)) for c in sorted(advmodcont.items(),key = lambda x :x[1],reverse=True)])))
-	
-	for p,c in posmod.items() :
-		advex.write('{}\t{}\n\n'.format(p,  ' '.join([','.join(map(str,pc)) for pc in sorted(c.items(),key=lambda x : x[1],reverse=True)])))
+	#We investigate ADV form types coinciding with forms of other parts of speech, which are looked up in the index of forms
+	with open(os.path.join(output,'ADV_coinc.tsv'),'w',encoding='utf8') as advex :
+		for fc in forms.rows(cadv) :
+			advex.write('{}\n'.format('\t'.join(fc)))
+	profile.lap('ADV_coinc.tsv')
+	#
+
+	#We investigate nominal-like dependents of ADVs
+	dnom = ('nmod', 'appos', 'nummod', 'acl', 'amod', 'det', 'clf', 'case', 'cop') #nominal dependents + the copula, which implies the ADV is not metapredicating
+
+	nomdependents = defaultdict(dict)
+	nominallike = set()
+	threshold = 5 #we want to avoid noise and find some regular patterns
+
+	for adv,ddiz in dadv.items() :
+		for dr,dc in ddiz.items() :
+			if dr.startswith(dnom) and cadv[adv] > threshold :
+				nomdependents[dr][adv] = dc/cadv[adv]
+				nominallike.add(adv)
+
+	with open(os.path.join(output,'ADV_nominals.tsv'),'w',encoding='utf8') as advex :
+		for d in nomdependents :
+			advex.write('{}\t{}\n\n'.format(d, ' '.join(['/'.join(map(str,i)) for i in sorted(nomdependents[d].items(), key = lambda x : x[1], reverse=True)])  ))
+	profile.lap('ADV_nominals.tsv')
+	#
+
+	#We print ADVs having a form different from the lemma
+	difforms = defaultdict(lambda : defaultdict(dict))
+
+	couples = [(aall,af.lower()) for af,al in ladv.items() for aall in dict.fromkeys(map(str.lower,al)) if aall != af.lower()]
+	for (aall,af),transformation in zip(couples,(engine or transformationengine).transformall(couples)) :
+		difforms['|'.join(map(str,transformation))][af][aall] = None
+
+	with open(os.path.join(output,'ADV_difflemma.tsv'),'w',encoding='utf8') as advex :
+		for df,fl in difforms.items() :
+			for f,ll in fl.items() :
+				advex.write('{}\t{}\t{}\n'.format( df, f, ','.join(ll) ))
+	profile.lap('ADV_difflemma.tsv')
+	#
+
+	#We print all morpholexical properties associated to ADVs
+	with open(os.path.join(output,'ADV_morpho.tsv'),'w',encoding='utf8') as advex :
+		for m in sorted(aggregates.advmorph) :
+			advex.write('{}\n'.format(m))
+	profile.lap('ADV_morpho.tsv')
+	#
+
+
+	#Overview of what takes the relation advmod
+	advmodcont, posmod = advmoddistributionsnumpy(aggregates.posmod) if vectorised else advmoddistributions(aggregates.posmod)
+
+	with open(os.path.join(output,'ADV_advmod.tsv'),'w',encoding='utf8') as advex :
+
+		advex.write('{}\n\n\n'.format('\n'.join(['\t'.join(map(str,c)) for c in advmodcont])))
+
+		advex.writelines('{}\t{}\n\n'.format(p,  ' '.join([','.join(map(str,pc)) for pc in c])) for p,c in posmod.items())
+	profile.lap('ADV_advmod.tsv')
+	#
+
+	#Groups of co-ordinated adverbs, by decreasing size, members being printed in order of appearance
+	with open(os.path.join(output,'ADV_coord.tsv'),'w',encoding='utf8') as advex :
+		for ac,_ in aggregates.advcoord.groups() :
+			advex.write('{}\n\n'.format('\t'.join(map(lambda x : x.upper() if x in nominallike else x,ac))))
+	profile.lap('ADV_coord.tsv')
+	#
 #
 
-#Groups of co-ordinated adverbs
-import networkx as nx
-from networkx.algorithms import connected_components
 
-ADVconj = nx.Graph(advcoord)
-connadv = connected_components(ADVconj)
+##Comparison of groups of documents (e.g. treebanks)
+
+#Tables comparing groups of documents, from their aggregates decoded into strings (see ADVaggregates.decoded), keyed by the names of the groups: frequencies of every ADV form type, and distribution of all ADV tokens over head categories (as in ADV_distr.tsv), for every group
+#If a list of ADV lemmas with the parts of speech of their bases is given (see Latin/ADV_omnia.tsv), the frequencies of ADV lemmas are aligned to it: lemmas of the list come first, in their order, then all other lemmas found in the data, without part of speech
+def writecomparison(groups,output,omnia=None) :
+
+	names = list(groups)
 
-with open(os.path.join(output,'ADV_coord.tsv'),'w',encoding='utf8') as advex :
-	for ac in sorted(list(connadv),key = lambda x : len(x),reverse=True) :
-		advex.write('{}\n\n'.format('\t'.join(map(lambda x : x.upper() if x in nominallike else x,ac))))
+	with open(os.path.join(output,'ADV_forms.tsv'),'w',encoding='utf8') as advex :
+		advex.write('Form type\t{}\n'.format('\t'.join(names)))
+		forms = dict.fromkeys(f for g in groups.values() for f in g.cadv)
+		advex.writelines('{}\t{}\n'.format(f,'\t'.join(str(groups[n].cadv.get(f,0)) for n in names)) for f in forms)
+	#
+
+	with open(os.path.join(output,'ADV_heads.tsv'),'w',encoding='utf8') as advex :
+		heads = {n:sum(g.tadv.values(),Counter()) for n,g in groups.items()}
+		modified = sorted(filter(None,set().union(*heads.values()))) #All UPOS appearing as heads of an ADV in any group
+		advex.write('Treebank\tFrequency\t{}\n'.format('\t'.join(modified)))
+		for n in names :
+			total = sum(groups[n].cadv.values())
+			advex.write('{}\t{}\t{}\n'.format(n,total,'\t'.join(str(heads[n].get(t,0)/total if total else 0.0) for t in modified)))
+	#
+
+	if omnia :
+		bases = readomnia(omnia)
+		lemmas = {n:sum(g.ladv.values(),Counter()) for n,g in groups.items()}
+		with open(os.path.join(output,'ADV_omnia.tsv'),'w',encoding='utf8') as advex :
+			advex.write('Lemma\tBase\t{}\n'.format('\t'.join(names)))
+			for l in dict.fromkeys(list(bases) + [l for n in names for l in lemmas[n]]) :
+				advex.write('{}\t{}\t{}\n'.format(l,bases.get(l,'_'),'\t'.join(str(lemmas[n].get(l,0)) for n in names)))
+	#
+#
+
+#Parts of speech of the bases of ADV lemmas, from a two-column table such as Latin/ADV_omnia.tsv
+def readomnia(path) :
+
+	with open(path,encoding='utf8') as omnia :
+		return {l.lower():b for l,b in (row.rstrip('\n').split('\t')[:2] for row in omnia if row.strip())}
 #
 
 
+##Main
+
+if __name__ == '__main__' :
+
+	import argparse, importlib.util
+	from contextlib import closing
+
+	#Input
+	parser = argparse.ArgumentParser(description='Extraction of statistics about adverbs (ADV) from CoNLL-U files.')
+	parser.add_argument('folder', nargs='+', help='The CoNLL-U files you want to analyse, either as a single document, a folder path, or an orderly comma-separated list of file/paths (can be mixed). Several arguments are treated as separate groups (e.g. treebanks), each one with its own output folder, which are processed together and compared (see --comparison).')
+	parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes, each one treating a whole document at a time (default: 1, i.e. no parallelism).')
+	parser.add_argument('--batch', type=int, default=None, help='With several worker processes, hand them batches of this number of sentences instead of whole documents, so that also single large documents are split among them.')
+	parser.add_argument('--shards', type=int, default=None, help='Split every (plain) document into shards of this number of sentences, found by a byte-offset index of its sentences, which are read on their own, also by different worker processes; the aggregates of every document are checkpointed at most once per minute and after its last shard, in the output folder (the comparison folder for several groups), so that an interrupted run resumes from the last one.')
+	parser.add_argument('--cache', nargs='?', const=True, default=None, help='Keep a binary cache of parsed documents, either next to them or in the given folder, so that following runs do not parse them again as long as they do not change.')
+	parser.add_argument('--incremental', nargs='?', const=True, default=None, help='Store the partial aggregates of every document, in the output folder (the comparison folder for several groups) or in the given one, so that following runs only process documents which have changed.')
+	parser.add_argument('--comparison', default='ADV_comparison', help='Output folder for the tables comparing several groups of documents (default: %(default)s).')
+	parser.add_argument('--omnia', nargs='?', const=os.path.join('Latin','ADV_omnia.tsv'), default=None, help='Align the frequencies of ADV lemmas of every group with a table of lemmas and parts of speech of their bases, by default %(const)s, in the comparison folder (also for a single group).')
+	parser.add_argument('--numpy', action='store_true', help='Compute the normalised tables (ADV_distr.tsv and ADV_advmod.tsv) with NumPy, in a vectorised way; the output does not change.')
+	parser.add_argument('--profile', default=None, help='File where the time spent in every phase (parsing, tree walks, nucleus extraction, aggregation, every table), with sentences and tokens per second, is reported for every document and overall: as a table if it ends in .tsv, as JSON otherwise.')
+	parser.add_argument('--transformations', choices=('difflib','automaton'), default='difflib', help='Algorithm finding the longest common substring of lemmas and forms for ADV_difflemma.tsv: difflib, or a faster suffix automaton giving the same results (default: %(default)s).')
+	args = parser.parse_args()
 
+	groups = [collecttexts(folder) for folder in args.folder]
 
+	outputs = [outputname(texts) for texts in groups]
+	for output in outputs :
+		if not os.path.exists(output):
+		    os.makedirs(output)
 
+	comparison = args.comparison if len(groups) > 1 or args.omnia else None
+	if comparison :
+		os.makedirs(comparison,exist_ok=True)
 
+	partials = os.path.join(comparison or outputs[0],'.partials') if args.incremental is True else args.incremental
+	checkpoints = os.path.join(comparison or outputs[0],'.checkpoints')
 
+	vectorised = args.numpy
+	if vectorised and importlib.util.find_spec('numpy') is None :
+		print('NumPy is not available, tables are computed without it.')
+		vectorised = False
+
+	profile, profiles = Profile(), {}
+
+	engine, compared = TransformationEngine(args.transformations), {}
+
+	#All documents of all groups are processed together (and by the same worker processes), then the aggregates of every group are merged
+	with closing(extractdocuments([t for texts in groups for t in texts],jobs=args.jobs,cache=args.cache,partials=partials,batch=args.batch,shards=args.shards,checkpoints=checkpoints,profiles=profiles)) as documents :
+		for texts, output in zip(groups,outputs) :
+			aggregates = ADVaggregates()
+			for _ in texts :
+				aggregates.update(next(documents)[1])
+			writetables(aggregates,output,vectorised=vectorised,engine=engine,profile=profile)
+			if comparison :
+				compared[groupname(texts)] = aggregates.decoded()
+
+	if comparison :
+		writecomparison(compared,comparison,args.omnia)
+
+	for p in profiles.values() :
+		profile.update(p)
+
+	profile.wall = time.perf_counter() - profile.started
+	print('{} sentences, {} tokens in {:.1f} s ({:.0f} sentences/s, {:.0f} tokens/s)'.format(profile.sentences,profile.tokens,profile.wall,profile.sentences/profile.wall,profile.tokens/profile.wall))
+	if args.profile :
+		writeprofile(args.profile,profile,profiles)
+#
@@ -1,7 +1,18 @@
 #The following code has been developed by Flavio Massimiliano Cecchini between 2018 and 2024. A package will hopefully be officially released at some point. Please give credit to the author if you use it. 
 #Contact: flaviomassimiliano.cecchini at kuleuven.be
 
-from collections import namedtuple
+import os
+import io
+import regex
+from array import array
+from bisect import bisect_right
+from collections import namedtuple, defaultdict, Counter
+from collections.abc import MutableMapping, Iterable
+from contextlib import nullcontext
+from functools import lru_cache
+from itertools import chain
+
+#Networkx is only imported when trees are actually represented as directed graphs
 
 ##Recurrent structures
 
@@ -9,6 +20,228 @@ from collections import namedtuple
 CoNLLURow = namedtuple('CoNLLURow', 'id form lemma upos xpos feats head deprel deps misc') 
 CoNLLURow.__new__.__defaults__ = ('_',)*len(CoNLLURow._fields) 
 
+#Structure of a row with given fields and default values (e.g. for CoNLL-U Plus files), created only once
+#The standard fields give the structure above, so that rows can be pickled (e.g. batches sent to worker processes)
+@lru_cache(maxsize=None)
+def rowstructure(fields,defaults) : 
+	
+	if fields == CoNLLURow._fields and defaults == CoNLLURow.__new__.__defaults__ :
+		return CoNLLURow
+	
+	row = namedtuple('CoNLLURow', ' '.join(fields))
+	row.__new__.__defaults__ = defaults
+	return row
+#
+
+#Structure of a nucleus (see extractnucleus)
+Nucleus = namedtuple('Nucleus', 'ids forms lemmas upos feats deprels') 
+
+#Separators of indices, and ranges of multiword tokens with a given decimal separator (see readCoNLLU)
+separators = regex.compile(r'[.-]') 
+
+@lru_cache(maxsize=None)
+def intervalpattern(decsep) : 
+	return regex.compile(r'\p{{N}}+{}?\p{{N}}*-\p{{N}}+{}?\p{{N}}*'.format(decsep,decsep)) 
+
+#Feats-like dictionary (see readUDfeatures) which is decoded from its string only when it is actually read or modified. Most of the times, feats and misc are just passed along or printed again (see writeUDfeatures), so that parsing them for every row is a waste
+class UDfeatures(MutableMapping) : 
+	
+	__slots__ = ('string','decoded')
+	
+	def __init__(self,string) : 
+		self.string = string
+		self.decoded = None
+	
+	def features(self) : 
+		if self.decoded is None :
+			self.decoded = readUDfeatures(self.string)
+		return self.decoded
+	
+	def __getitem__(self,key) : 
+		return self.features()[key]
+	
+	def __setitem__(self,key,value) : 
+		self.features()[key] = value
+	
+	def __delitem__(self,key) : 
+		del self.features()[key]
+	
+	def __iter__(self) : 
+		return iter(self.features())
+	
+	def __len__(self) : 
+		return len(self.features())
+	
+	def __repr__(self) : 
+		return repr(self.features())
+#
+
+#Comments of a sentence, as a dictionary of their values, as strings; comments without any value (e.g. newdoc) have an empty one, like comments with an empty value (e.g. text = ), but their keys are also kept apart in bare, so that both are written back as they were (see writeCoNLLU)
+class CoNLLUComments(dict) : 
+	
+	__slots__ = ('bare',)
+	
+	def __init__(self,*args,**kwargs) : 
+		super().__init__(*args,**kwargs)
+		self.bare = set()
+#
+
+#Table of interned strings (e.g. forms, lemmas, parts of speech and relations), each one identified by a small integer code. The codes of the lowercased string and of the string without subtypes (i.e. up to the first colon) are computed only once for every distinct string, and found in lowered and based
+#Compact trees can be encoded by means of a table while they are read (see readCoNLLU), so that the same strings are not transformed, stored or hashed over and over
+class SymbolTable : 
+	
+	__slots__ = ('fields','strings','index','lowered','based')
+	
+	def __init__(self,fields=('form','lemma','upos','deprel')) : 
+		
+		self.fields = tuple(fields) #fields encoded in trees
+		self.strings = []
+		self.index = {}
+		self.lowered = array('l')
+		self.based = array('l')
+	
+	def __len__(self) : 
+		return len(self.strings)
+	
+	def __contains__(self,string) : 
+		return string in self.index
+	
+	#The string with a given code
+	def __getitem__(self,code) : 
+		return self.strings[code]
+	
+	#The code of a string, which is added to the table if needed, together with its variants
+	def code(self,string) : 
+		
+		c = self.index.get(string)
+		if c is None :
+			c = self.index[string] = len(self.strings)
+			self.strings.append(string)
+			self.lowered.append(c)
+			self.based.append(c)
+			lower, base = string.lower(), string.split(':')[0]
+			if lower != string :
+				self.lowered[c] = self.code(lower)
+			if base != string :
+				self.based[c] = self.code(base)
+		return c
+	
+	#The codes of a sequence of strings, as an array
+	def encode(self,strings) : 
+		
+		index, code = self.index, self.code
+		return array('l',[index[s] if s in index else code(s) for s in strings])
+#
+
+#Compact, array-backed alternative to a Networkx directed graph for a syntactic tree (see readCoNLLU). Every field of the rows is stored in a column, i.e. a list parallel to the other ones, where nodes are sorted by their index, the formal root (0,0) coming first. Dependents are found by means of a child-offset index: the positions of the dependents of the node at position p are children[childstart[p]:childstart[p+1]]
+#Nodes are still identified by their index (see readCoNLLU), and are returned as named tuples built on demand, so that the same methods can be used on both representations (see getnode and dependents)
+#Since these trees are not meant to be modified, results of repeated tree walks (see truehead and extractnucleus) are memoised in the tree itself, and go away with it
+#If the tree has been encoded by means of a symbol table (see SymbolTable), codes holds the columns of codes of the encoded fields
+class CoNLLUSentence : 
+	
+	__slots__ = ('row','columns','positions','childstart','children','memo','codes')
+	
+	#Either rows (named tuples of type row), in any order, or whole columns, already sorted and beginning with the root, can be given, possibly with their child-offset index
+	def __init__(self,nodes=(),row=CoNLLURow,columns=None,index=None) : 
+		
+		if columns is None :
+			nodes = sorted(nodes,key = lambda x : x.id)
+			if not nodes or nodes[0].id != (0,0) : #the artificial root is always present
+				nodes.insert(0,row(id=(0,0)))
+			columns = tuple(map(list,zip(*nodes)))
+		
+		self.row = row
+		self.columns = columns
+		self.positions = {n:p for p,n in enumerate(self.columns[0])}
+		self.memo = {}
+		self.codes = None
+		
+		if index is not None :
+			self.childstart, self.children = index
+			return
+		
+		#Child-offset index, built by counting the dependents of each node
+		heads = self.column('head') if 'head' in self.row._fields else ()
+		parents = [self.positions.get(h,-1) if isinstance(h,tuple) else -1 for h in heads]
+		self.childstart = array('l',[0])*(len(self)+1)
+		for h in parents : 
+			if h >= 0 :
+				self.childstart[h+1] += 1
+		for p in range(len(self)) :
+			self.childstart[p+1] += self.childstart[p]
+		self.children = array('l',[0])*self.childstart[-1]
+		filled = self.childstart[:-1]
+		for p,h in enumerate(parents) : #positions are already sorted, and so will be the dependents of each node
+			if h >= 0 :
+				self.children[filled[h]] = p
+				filled[h] += 1
+	#
+	
+	def __len__(self) : 
+		return len(self.columns[0])
+	
+	def __iter__(self) : 
+		return iter(self.columns[0])
+	
+	def __contains__(self,node) : 
+		return node in self.positions
+	
+	#A whole column, i.e. the values of a field for all nodes, in linear order
+	def column(self,field) : 
+		return self.columns[self.row._fields.index(field)]
+	
+	#The node with a given index, as a named tuple
+	def node(self,node) : 
+		p = self.positions[node]
+		return self.row._make([c[p] for c in self.columns])
+	
+	#Encoding of the fields of a symbol table, as columns of codes
+	def encode(self,symbols) : 
+		self.codes = {f:symbols.encode(self.column(f)) for f in symbols.fields if f in self.row._fields}
+		return self
+	
+	#Indices of the direct dependents of a node, in linear order
+	def dependents(self,node) : 
+		p = self.positions[node]
+		ids = self.columns[0]
+		return [ids[c] for c in self.children[self.childstart[p]:self.childstart[p+1]]]
+	
+	#Positions of the true heads of all nodes modulo given relations (see truehead), computed at once from the root downwards, so that the head of a node is always treated before the node itself
+	#Nodes which cannot be reached from the root have -1
+	def trueheads(self,conj=(),sub=False) : 
+		
+		key = ('truehead',frozenset(conj),sub)
+		if key not in self.memo :
+			
+			deprels = self.column('deprel')
+			heads = array('l',[-1])*len(self)
+			heads[0] = 0
+			
+			queue = [0]
+			for p in queue : #the queue grows while it is read
+				for c in self.children[self.childstart[p]:self.childstart[p+1]] :
+					heads[c] = heads[p] if (deprels[c].split(':')[0] if not sub else deprels[c]) in conj else c
+					queue.append(c)
+			
+			self.memo[key] = heads
+		
+		return self.memo[key]
+	
+	#Conversion to the Networkx representation
+	def tograph(self) : 
+		
+		import networkx
+		
+		tree = networkx.DiGraph()
+		for p,n in enumerate(self.columns[0]) :
+			node = self.row._make([c[p] for c in self.columns])
+			tree.add_node(n, features=node)
+			if isinstance(node.head,tuple) :
+				tree.add_edge(node.head,n)
+		
+		return tree
+#
+
 
 ##Methods to read and write CoNLL-U (plus) files
 
@@ -16,37 +249,59 @@ CoNLLURow.__new__.__defaults__ = ('_',)*len(CoNLLURow._fields)
 #Every node is identified by a couple of real numbers: a positive index (zero only for the formal root) and a negative range for multiword tokens, zero otherwise.
 #Also an empty tree, i.e. with no syntax, can be read
 #Enhanced dependencies are not yet implemented
-def readCoNLLU(conllu,comments='#',sents='sent_id',encoding='utf8', decsep=',',syntax=True,plus=False) : 
+#With compact=True, trees are instead returned as lighter CoNLLUSentence objects, which support the extractive methods below, but not the whole Networkx interface
+#Feats and misc are returned as UDfeatures, i.e. dictionaries decoded only when needed
+#With cache=True (a cache file next to the document) or cache=<folder>, parsed trees are stored in a binary cache, from which they are read again as long as the document does not change (see cachedCoNLLU)
+#The document can be a path, also to a compressed file (see openCoNLLU), or an already open text stream (or any iterable of rows), which is not cached
+#Compact trees can be encoded by means of a symbol table (see SymbolTable), which is filled while reading
+def readCoNLLU(conllu,comments='#',sents='sent_id',encoding='utf8', decsep=',',syntax=True,plus=False,compact=False,cache=None,symbols=None) : 
+	
+	if symbols is not None and not compact :
+		raise Exception('Careful! Only compact trees can be encoded by means of a symbol table.')
+	
+	path = isinstance(conllu,(str,os.PathLike))
+	
+	if cache and path :
+		yield from cachedCoNLLU(conllu,cache,symbols=symbols,comments=comments,sents=sents,encoding=encoding,decsep=decsep,syntax=syntax,plus=plus,compact=compact)
+		return
 	
-	from collections import namedtuple
-	import regex, networkx
-	from networkx.algorithms.cycles import simple_cycles
-	from networkx.classes.function import is_empty
+	encoded = (lambda tree : tree.encode(symbols)) if symbols is not None else (lambda tree : tree)
+	
+	if not compact :
+		import networkx
+		from networkx.classes.function import is_empty
 	
 	if decsep in ('-','.') : #not admitted, already used for ranges and extra nodes in enhanced annotation
 		raise Exception('Careful! The decimal separator must differ from . or -.')
 	
-	separators = regex.compile(r'[.-]') 
-	interval = regex.compile(r'\p{{N}}+{}?\p{{N}}*-\p{{N}}+{}?\p{{N}}*'.format(decsep,decsep)) 
+	interval = intervalpattern(decsep)
+	
+	sentence = CoNLLUComments()
+	edges = False #for compact trees, whether some syntactic relation has been read
 	
-	sentence = {}
+	#A tree is output if it has some syntax, or at least some nodes if syntax is not required
+	complete = lambda tree : (edges if compact else not is_empty(tree)) or (not syntax and (tree if compact else tree.nodes()))
 
-	with open(conllu,'r',encoding=encoding) as document :
+	with openCoNLLU(conllu,encoding=encoding) if path else nullcontext(conllu) as document :
+		
+		document = iter(document)
 		
 		#Definition of fields and rows
 		fields = ('id', 'form', 'lemma', 'upos', 'xpos', 'feats', 'head', 'deprel', 'deps', 'misc')
 		plusfields = ()
 		if plus :
-			plusfields = tuple(map(lambda x : x.replace(':','_'),document.readline()[len('# global.columns = '):].strip(' \n').split(' ')))
+			plusfields = tuple(map(lambda x : x.replace(':','_'),next(document,'')[len('# global.columns = '):].strip(' \n').split(' ')))
 		else :
 			plusfields = tuple(fields)
 		#
 		nfields = len(plusfields)
-		CoNLLURow = 	namedtuple('CoNLLURow', ' '.join(map(str.lower,plusfields)))
-		CoNLLURow.__new__.__defaults__ = tuple(('_' if c in fields else '*') for c in plusfields)  
+		lowered = tuple(map(str.lower,plusfields)) #headers of Plus files are usually in upper case
+		CoNLLURow = rowstructure(lowered,tuple(('_' if c in fields else '*') for c in lowered))
+		featsfields = [i for i,c in enumerate(lowered) if c in ('feats','misc')] #Plus files do not necessarily have feats nor misc, nor head
+		headfield = lowered.index('head') if 'head' in lowered else None
 		#
 		
-		tree = networkx.DiGraph() 
+		tree = [] if compact else networkx.DiGraph() 
 		
 		for row in document :
 			
@@ -54,48 +309,395 @@ def readCoNLLU(conllu,comments='#',sents='sent_id',encoding='utf8', decsep=',',s
 			
 			if row.startswith(comments) : 
 			
-				comm, _, value = row[1:].partition('=')
+				comm, equal, value = row[1:].partition('=')
 				sentence[comm.strip()] = value.strip()
+				if not equal : 
+					sentence.bare.add(comm.strip())
 				
 				if comm.strip() == sents :
-					tree = networkx.DiGraph() #syntactic tree: rooted, oriented tree with linear order on the nodes
-					tree.add_node((0,0), features = CoNLLURow(id=(0,0))) #artificial node root from which the tree descends
+					if compact :
+						tree, edges = [CoNLLURow(id=(0,0))], False
+					else :
+						tree = networkx.DiGraph() #syntactic tree: rooted, oriented tree with linear order on the nodes
+						tree.add_node((0,0), features = CoNLLURow(id=(0,0))) #artificial node root from which the tree descends
 			#	
 			elif row.startswith(('1','2','3','4','5','6','7','8','9')) : #token of any kind #this is the most specific condition possible, made explicit
 
-				node = CoNLLURow._make(row.split('\t')[:nfields])
+				cells = row.split('\t')[:nfields]
 				
-				for f in {'feats','misc'}.intersection(plusfields) : #Plus files do not necessarily have feats nor misc
-					node = node._replace(**{f : readUDfeatures(getattr(node,f))}) #We need to convert feats-like strings into dictionaries, and viceversa
-					#node = node._replace(feats=readUDfeatures(node.feats),\
-					#					 misc=readUDfeatures(node.misc)\
-					#					) 
+				for f in featsfields : 
+					cells[f] = UDfeatures(cells[f]) #We need to convert feats-like strings into dictionaries, and viceversa; this is done lazily
 				#
-			
-				index = list(map(lambda  x : float(x.replace(decsep,'.')),regex.split(separators,node.id))) #the dot is needed by Python floats
-				index += [0]*(2-len(index)) #ordering always works on couples; zero is the default value for regular words
-				if regex.fullmatch(interval,node.id) : #treatment of multiword tokens
-					index[1] = index[0] - index[1] #the span of the range is given by a negative number
-				node = node._replace(id=tuple(index))
 				
-				try : 
-					node = node._replace(head=int(node.head)) #we prefer an integer instead of a string
-				except (ValueError) : #when there is no syntax
-					pass 
+				nid = cells[0]
+				if nid.isdecimal() : #fast path for regular syntactic words, which are the vast majority of rows
+					cells[0] = (float(nid),0)
+				else :
+					index = list(map(lambda  x : float(x.replace(decsep,'.')),separators.split(nid))) #the dot is needed by Python floats
+					index += [0]*(2-len(index)) #ordering always works on couples; zero is the default value for regular words
+					if interval.fullmatch(nid) : #treatment of multiword tokens
+						index[1] = index[0] - index[1] #the span of the range is given by a negative number
+					cells[0] = tuple(index)
 				
-				tree.add_node(node.id, features=node._replace(head=(node.head,0) if isinstance(node.head,int) else node.head)) #option for headless nodes, e.g. multiword tokens
-				if isinstance(node.head,int) :
-					tree.add_edge((node.head,0),node.id) 
+				head = cells[headfield] if headfield is not None else '_'
+				if head.isdecimal() : #we prefer an integer instead of a string
+					head = int(head)
+				else : 
+					try : 
+						head = int(head)
+					except (ValueError) : #when there is no syntax
+						pass 
+				if headfield is not None :
+					cells[headfield] = (head,0) if isinstance(head,int) else head #option for headless nodes, e.g. multiword tokens
+				
+				node = CoNLLURow._make(cells)
+				
+				if compact :
+					tree.append(node)
+					edges = edges or isinstance(head,int)
+				else :
+					tree.add_node(node.id, features=node) 
+					if isinstance(head,int) :
+						tree.add_edge((head,0),node.id) 
 			#
-			elif not is_empty(tree) or (not syntax and tree.nodes()) : 
-				yield sentence, tree
-				tree = networkx.DiGraph() #we re-imitialise the syntactic tree
-				sentence = {}
+			elif complete(tree) : 
+				yield sentence, encoded(CoNLLUSentence(tree,CoNLLURow)) if compact else tree
+				tree = [] if compact else networkx.DiGraph() #we re-imitialise the syntactic tree
+				sentence = CoNLLUComments()
+				edges = False
 			#
 			
 		#to print the final tree	
-		if not is_empty(tree) or (not syntax and tree.nodes()) :
-			yield sentence, tree
+		if complete(tree) :
+			yield sentence, encoded(CoNLLUSentence(tree,CoNLLURow)) if compact else tree
+#
+
+#Opens a CoNLL-U document as a text stream with large buffered reads; compressed documents are decompressed on the fly, according to their extension: .gz (gzip), .bz2 (bzip2), .xz or .lzma (LZMA), .zst or .zstd (Zstandard, only if the zstandard package is installed)
+def openCoNLLU(conllu,encoding='utf8',buffering=1<<20) : 
+	
+	conllu = str(conllu)
+	if conllu.endswith('.gz') :
+		import gzip
+		raw = gzip.open(conllu,'rb')
+	elif conllu.endswith('.bz2') :
+		import bz2
+		raw = bz2.open(conllu,'rb')
+	elif conllu.endswith(('.xz','.lzma')) :
+		import lzma
+		raw = lzma.open(conllu,'rb')
+	elif conllu.endswith(('.zst','.zstd')) :
+		try :
+			import zstandard
+		except (ImportError) :
+			raise Exception('Careful! The zstandard package is needed to read {}.'.format(conllu))
+		raw = zstandard.ZstdDecompressor().stream_reader(open(conllu,'rb'))
+	else :
+		return open(conllu,'r',encoding=encoding,buffering=buffering)
+	
+	return io.TextIOWrapper(io.BufferedReader(raw,buffer_size=buffering),encoding=encoding)
+#
+
+#Extensions of the documents which can be read (see openCoNLLU)
+compressions = ('.gz','.bz2','.xz','.lzma','.zst','.zstd')
+
+#Generator of batches (lists) of a given number of sentences with their trees, as returned by readCoNLLU, so that they can be handled in one go
+def readCoNLLUbatches(conllu,size=1000,**options) : 
+	
+	batch = []
+	for sentence in readCoNLLU(conllu,**options) :
+		batch.append(sentence)
+		if len(batch) == size :
+			yield batch
+			batch = []
+	if batch :
+		yield batch
+#
+
+#Generator of batches of a given number of sentences as raw text, to be parsed somewhere else (e.g. by worker processes) with readCoNLLU, through a text stream
+#Sentences are split on empty rows following some token; for Plus documents, the header with the columns is repeated at the beginning of every batch
+def rawCoNLLUbatches(conllu,size=1000,encoding='utf8',plus=False) : 
+	
+	with openCoNLLU(conllu,encoding=encoding) as document :
+		
+		header = [document.readline()] if plus else []
+		rows, count, tokens = list(header), 0, False
+		
+		for row in document :
+			rows.append(row)
+			if row.strip('\n\r ') :
+				tokens = tokens or row.startswith(('1','2','3','4','5','6','7','8','9'))
+			elif tokens :
+				count, tokens = count + 1, False
+				if count == size :
+					yield ''.join(rows)
+					rows, count = list(header), 0
+		
+		if any(r.strip('\n\r ') for r in rows[len(header):]) :
+			yield ''.join(rows)
+#
+
+#Index of the sentences of a CoNLL-U document by their byte offsets, found by scanning it for empty rows following some token (as in rawCoNLLUbatches), so that any sentence, or any shard of consecutive sentences, can be read on its own by seeking to it
+#The offsets are those of the beginning of every sentence (with its comments) and of the end of the document; sentences are also indexed by their identifier, for random access
+#Only plain documents can be indexed, as compressed ones cannot be seeked into; for Plus documents, the header with the columns is kept apart and put back at the beginning of every shard
+class SentenceIndex :
+
+	__slots__ = ('conllu','encoding','header','offsets','ids')
+
+	def __init__(self,conllu,comments='#',sents='sent_id',encoding='utf8',plus=False) :
+
+		self.conllu, self.encoding = str(conllu), encoding
+		if self.conllu.endswith(compressions) :
+			raise Exception('Careful! Compressed documents cannot be indexed by byte offsets: {}.'.format(conllu))
+
+		self.offsets, self.ids = array('q'), {}
+		comments, sents = comments.encode(encoding), sents.encode(encoding)
+
+		with open(self.conllu,'rb',buffering=1<<20) as document :
+
+			self.header = document.readline() if plus else b''
+			position, start, tokens, sentid = len(self.header), None, False, None
+
+			for row in document :
+				if row.strip(b'\n\r ') :
+					start = position if start is None else start
+					if row.startswith(comments) :
+						comm, _, value = row[len(comments):].partition(b'=')
+						if comm.strip() == sents :
+							sentid = value.strip().decode(encoding)
+					else :
+						tokens = tokens or row.startswith((b'1',b'2',b'3',b'4',b'5',b'6',b'7',b'8',b'9'))
+				elif tokens : #rows without any token (e.g. only comments) stay with the following sentence
+					self.add(start,sentid)
+					start, tokens, sentid = None, False, None
+				position += len(row)
+
+			if tokens :
+				self.add(start,sentid)
+			self.offsets.append(position)
+	#
+
+	def add(self,start,sentid) :
+
+		if sentid is not None :
+			self.ids.setdefault(sentid,len(self.offsets))
+		self.offsets.append(start)
+	#
+
+	def __len__(self) :
+		return len(self.offsets) - 1
+	#
+
+	#Byte ranges of shards of a given number of consecutive sentences, covering the whole document
+	def shards(self,size) :
+		return [(self.offsets[i],self.offsets[min(i+size,len(self))]) for i in range(0,len(self),size)]
+	#
+
+	#Sentences with their trees from the i-th to the j-th (excluded; by default, only the i-th), as returned by readCoNLLU with the given options
+	def read(self,i,j=None,**options) :
+
+		j = i + 1 if j is None else j
+		return readCoNLLUrange(self.conllu,self.offsets[i],self.offsets[j],header=self.header,encoding=self.encoding,**options)
+	#
+
+	#A single sentence with its tree, by its identifier
+	def sentence(self,sentid,**options) :
+
+		if sentid not in self.ids :
+			raise Exception('Careful! There is no sentence {} in {}.'.format(sentid,self.conllu))
+		return next(self.read(self.ids[sentid],**options))
+	#
+#
+
+#Sentences with their trees from a byte range of a plain CoNLL-U document (see SentenceIndex), parsed on their own by readCoNLLU; for Plus documents, their header has to be given
+#Whether the document is a Plus one is given by the header alone, so that an explicit plus option is ignored
+def readCoNLLUrange(conllu,start,end,header=b'',encoding='utf8',**options) :
+
+	options.pop('plus',None)
+	with open(conllu,'rb') as document :
+		document.seek(start)
+		raw = document.read(end - start)
+
+	yield from readCoNLLU(io.StringIO((header + raw).decode(encoding)),encoding=encoding,plus=bool(header),**options)
+#
+
+#Binary cache of a parsed CoNLL-U document, stored in columnar form: every field is an array of integer codes into a table of distinct strings (or an array of numbers, for indices and heads), so that it can be memory-mapped and read back without tokenising again
+#The cache is keyed by the path, size and content hash of the document, together with the reading options; if any of them changes, the document is parsed again and the cache rewritten
+#Trees are returned as by readCoNLLU; if they are encoded by means of a symbol table, the codes of the strings of the cache are translated just once
+CACHEMAGIC = b'CoNLLUcache\n'
+CACHEVERSION = 2
+
+def cachedCoNLLU(conllu,cache,compact=False,symbols=None,**options) : 
+	
+	import json, mmap, struct, sys, tempfile
+	
+	conllu = os.fspath(conllu)
+	if cache is True :
+		cachefile = conllu + '.cache'
+	else :
+		os.makedirs(cache,exist_ok=True)
+		cachefile = os.path.join(cache,'{}_{}.cache'.format(stringhash(os.path.abspath(conllu))[:16],os.path.basename(conllu)))
+	
+	key = {'path' : os.path.abspath(conllu),\
+		   'size' : os.path.getsize(conllu),\
+		   'hash' : filehash(conllu),\
+		   'options' : options,\
+		   'version' : CACHEVERSION,\
+		   'byteorder' : sys.byteorder}
+	
+	#Reading from a valid cache
+	header = None
+	if os.path.exists(cachefile) :
+		with open(cachefile,'rb') as cached :
+			if cached.read(len(CACHEMAGIC)) == CACHEMAGIC :
+				header = json.loads(cached.read(struct.unpack('<Q',cached.read(8))[0]))
+				header = header if header['key'] == key else None
+	
+	if header :
+		with open(cachefile,'rb') as cached, mmap.mmap(cached.fileno(),0,access=mmap.ACCESS_READ) as mapped :
+			
+			views = [] #memory views on the map have to be released before closing it, even if not all trees are read
+			def block(name) :
+				a, b, code = header['blocks'][name]
+				views.append(memoryview(mapped)[header['start']+a:header['start']+b].cast(code))
+				return views[-1]
+			#
+			def table(name) :
+				strings, offsets = block(name+'.strings'), block(name+'.offsets')
+				return [str(strings[a:b],'utf8') for a,b in zip(offsets[:-1],offsets[1:])]
+			#
+			
+			try :
+				fields = header['fields']
+				CoNLLURow = rowstructure(tuple(fields),tuple(header['defaults']))
+				tables = {f:table(f) for f in fields if f not in ('id','head')}
+				heads, commenttable = table('head'), table('comments')
+				sentstart, commentstart, commentkeys, commentvalues = block('sentences'), block('commentstart'), block('commentkeys'), block('commentvalues')
+				ids, secondary, headcodes = block('id'), block('idrange'), block('head')
+				childstart, children, childrenstart = block('childstart'), block('children'), block('childrenstart')
+				codes = {f:block(f) for f in tables}
+				translations = {f:symbols.encode(tables[f]) for f in symbols.fields if f in tables} if symbols is not None else {}
+				
+				for s in range(header['sentences']) :
+					
+					a, b = sentstart[s], sentstart[s+1]
+					sentence = CoNLLUComments()
+					for k,v in zip(commentkeys[commentstart[s]:commentstart[s+1]],commentvalues[commentstart[s]:commentstart[s+1]]) :
+						sentence[commenttable[k]] = commenttable[v] if v >= 0 else ''
+						if v < 0 : #comments without any value
+							sentence.bare.add(commenttable[k])
+					columns = []
+					for f in fields :
+						if f == 'id' :
+							columns.append([(i,j) if j else (i,0) for i,j in zip(ids[a:b],secondary[a:b])])
+						elif f == 'head' :
+							columns.append([(h,0) if h >= 0 else heads[-h-1] for h in headcodes[a:b]])
+						elif f in ('feats','misc') : #the root keeps its bare string, as when reading the document
+							columns.append([t if p == 0 else UDfeatures(t) for p,t in enumerate(map(tables[f].__getitem__,codes[f][a:b]))])
+						else :
+							columns.append(list(map(tables[f].__getitem__,codes[f][a:b])))
+					index = (array('l',childstart[a+s:b+s+1]), array('l',children[childrenstart[s]:childrenstart[s+1]]))
+					tree = CoNLLUSentence(row=CoNLLURow,columns=tuple(columns),index=index)
+					if symbols is not None :
+						tree.codes = {f:array('l',map(t.__getitem__,codes[f][a:b])) for f,t in translations.items()}
+					
+					yield sentence, tree if compact else tree.tograph()
+			finally :
+				for view in reversed(views) :
+					view.release()
+		return
+	#
+	
+	#Otherwise, the document is parsed, and the cache is written once all trees have been read
+	tables = {}
+	intern = lambda name,string : tables.setdefault(name,{}).setdefault(string,len(tables[name]))
+	blocks = {name:array(code) for name,code in (('sentences','q'),('commentstart','q'),('commentkeys','i'),('commentvalues','i'),('id','d'),('idrange','d'),('head','i'),('childstart','i'),('children','i'),('childrenstart','q'))}
+	blocks['sentences'].append(0)
+	blocks['commentstart'].append(0)
+	blocks['childrenstart'].append(0)
+	fields, defaults = None, None
+	
+	for sentence, tree in readCoNLLU(conllu,compact=True,symbols=symbols,**options) :
+		
+		if fields is None :
+			fields, defaults = tree.row._fields, tree.row.__new__.__defaults__
+			blocks.update({f:array('i') for f in fields if f not in ('id','head')})
+		
+		for k,v in sentence.items() :
+			blocks['commentkeys'].append(intern('comments',k))
+			blocks['commentvalues'].append(-1 if k in sentence.bare else intern('comments',v))
+		blocks['commentstart'].append(len(blocks['commentkeys']))
+		
+		for f,column in zip(fields,tree.columns) :
+			if f == 'id' :
+				blocks['id'].extend([i for i,_ in column])
+				blocks['idrange'].extend([j for _,j in column])
+			elif f == 'head' :
+				blocks['head'].extend([h[0] if isinstance(h,tuple) else -intern('head',h)-1 for h in column])
+			else :
+				blocks[f].extend([intern(f,v.string if isinstance(v,UDfeatures) else v) for v in column])
+		blocks['sentences'].append(blocks['sentences'][-1] + len(tree))
+		blocks['childstart'].fromlist(tree.childstart.tolist()) #one more offset than nodes for every sentence
+		blocks['children'].fromlist(tree.children.tolist())
+		blocks['childrenstart'].append(len(blocks['children']))
+		
+		yield sentence, tree if compact else tree.tograph()
+	#
+	
+	if fields is None : #nothing to store
+		return
+	
+	for name in ('head','comments') + tuple(f for f in fields if f not in ('id','head')) :
+		encoded = [t.encode('utf8') for t in tables.get(name,{})]
+		offsets = array('q',[0])
+		for e in encoded :
+			offsets.append(offsets[-1] + len(e))
+		blocks[name+'.offsets'] = offsets
+		blocks[name+'.strings'] = array('B',b''.join(encoded))
+	
+	positions, start = {}, 0
+	for name, block in blocks.items() :
+		positions[name] = (start, start + len(block)*block.itemsize, block.typecode)
+		start += -(-len(block)*block.itemsize//8)*8 #blocks are aligned to 8 bytes
+	
+	header = {'key' : key, 'fields' : fields, 'defaults' : defaults, 'sentences' : len(blocks['sentences'])-1, 'blocks' : positions}
+	encodedheader = json.dumps(header).encode('utf8')
+	header['start'] = -(-(len(CACHEMAGIC) + 8 + len(encodedheader) + 64)//8)*8 #room for the start itself in the header
+	encodedheader = json.dumps(header).encode('utf8').ljust(header['start'] - len(CACHEMAGIC) - 8)
+	
+	#Every writer has its own temporary file, as several processes might cache the same document at once; whichever replaces the cache last wins, as all caches are the same
+	descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(cachefile) or '.',prefix=os.path.basename(cachefile)+'.',suffix='.tmp')
+	with os.fdopen(descriptor,'wb') as cached :
+		cached.write(CACHEMAGIC)
+		cached.write(struct.pack('<Q',len(encodedheader)))
+		cached.write(encodedheader)
+		for name, block in blocks.items() :
+			cached.seek(header['start'] + positions[name][0])
+			block.tofile(cached)
+	try :
+		os.replace(temporary,cachefile) #a cache is never left half-written
+	except (OSError) : #e.g. the cache is being read by another process, on some systems
+		os.remove(temporary)
+#
+
+#Hash of the content of a file, read in chunks
+def filehash(path,chunk=1<<20) : 
+	
+	import hashlib
+	
+	digest = hashlib.blake2b(digest_size=20)
+	with open(path,'rb') as document :
+		for block in iter(lambda : document.read(chunk), b'') :
+			digest.update(block)
+	
+	return digest.hexdigest()
+#
+
+#Hash of a string, e.g. to build file names
+def stringhash(string) : 
+	
+	import hashlib
+	
+	return hashlib.blake2b(string.encode('utf8'),digest_size=20).hexdigest()
 #
 
 #Produces a dictionary out of a feats-like string, taking into account possible multiple values for a feature with tuples
@@ -108,50 +710,103 @@ def readUDfeatures(ftstring,null=('_',),sepfeat='|',sepval='=',sepint=',') :
 #
 
 #The inverse of the previous method, either from a dictionary or a named tuple
+#Lazy features which have not been decoded are printed directly from their string, normalised only once for each distinct string
 def writeUDfeatures(tfeats,sepfeat='|',sepval='=',sepint=',') : 
 	
-	if not any(tfeats.values()) : #even if we have feature names, if they are empty it means they have not to be annotated
+	if isinstance(tfeats,UDfeatures) and tfeats.decoded is None and (sepfeat,sepval,sepint) == ('|','=',',') :
+		return normalisedUDfeatures(tfeats.string)
+	elif not any(tfeats.values()) : #even if we have feature names, if they are empty it means they have not to be annotated
 		return '_'
 	else : 
 		return sepfeat.join([sepval.join([f,sepint.join(sorted(( (v,) if isinstance(v,str) else v )))])\
 						 for f,v in sorted(tfeats.items(), key = lambda x : x[0].lower()) if v]) #we need to be able to treat at the same time values expressed as bare strings or as tuples
+#
+
+#Normal form of a feats-like string, as printed by writeUDfeatures; the number of distinct strings is usually small, so that results are cached
+@lru_cache(maxsize=65536)
+def normalisedUDfeatures(ftstring) : 
+	
+	return writeUDfeatures(readUDfeatures(ftstring))
 #	
 
-#Prints with correct formatting a tree as represented in CoNLL-U (plus) files, from the output of readCoNLLU
+#Prints with correct formatting a tree as represented in CoNLL-U (plus) files, from the output of readCoNLLU (of either representation)
 #If needed, nodes with given attributes can be ignored 
 #Enhanced annotation is still not stably implemented
 def printCoNLLUtree(tree,data='features',ignored={},syntax=True) :
 	
-	import networkx,regex
-	from operator import itemgetter	
-	from collections import namedtuple
+	return CoNLLUrows(tree,ignoredconditions(ignored),syntax,data)
+#
+
+#Writes sentences with their trees, as given by readCoNLLU, to a CoNLL-U document or to an open text stream, through a large buffer; comments are written too, unless comments=False
+#Rows are as printed by printCoNLLUtree, but the conditions for ignoring nodes are compiled only once for all trees
+#The number of sentences written is returned
+def writeCoNLLU(sentences,conllu,data='features',ignored={},syntax=True,comments=True,encoding='utf8',buffering=1<<20) :
+	
+	conditions = ignoredconditions(ignored)
+	written = 0
+	
+	with open(conllu,'w',encoding=encoding,buffering=buffering) if isinstance(conllu,(str,os.PathLike)) else nullcontext(conllu) as document :
+		for sentence, tree in sentences :
+			if comments :
+				bare = sentence.bare if isinstance(sentence,CoNLLUComments) else {k for k,v in sentence.items() if not v} #in plain dictionaries, empty values are taken as absent
+				document.writelines(('# {}\n' if k in bare else '# {} = {}\n').format(k,v) for k,v in sentence.items())
+			document.write(CoNLLUrows(tree,conditions,syntax,data))
+			written += 1
+	
+	return written
+#
+
+#Conditions for ignoring nodes, meant as a disjunction: fields with compiled regular expressions to be searched in them
+def ignoredconditions(ignored) :
+	
+	return tuple((field,regex.compile(cond).search) for field,cond in ignored.items())
+#
+
+#The rows of a tree, with indices and heads recomputed so that they are progressive, even if some nodes are ignored; nodes are sorted only once
+#Feats and misc are printed by writeUDfeatures, i.e. directly from their normalised string if they have not been modified
+def CoNLLUrows(tree,conditions=(),syntax=True,data='features') :
+	
+	if isinstance(tree,CoNLLUSentence) :
+		fields, nodes = tree.row._fields, list(zip(*tree.columns))[1:] #the root comes first
+	else :
+		nodes = [tree.nodes[n][data] for n in sorted(tree) if n != (0,0)]
+		fields = nodes[0]._fields if nodes else CoNLLURow._fields
+	
+	idfield, headfield = fields.index('id'), fields.index('head') if 'head' in fields else None
+	featsfields = [i for i,f in enumerate(fields) if f in ('feats','misc')]
+	
+	if conditions :
+		text = lambda x : x if isinstance(x,str) else writeUDfeatures(x)
+		checks = [(fields.index(f),search) for f,search in conditions]
+		nodes = [n for n in nodes if not any(search(text(n[i])) for i,search in checks)]
 	
-	#the set of conditions for ignoring are meant as a disjunction
-	no = lambda x : any(bool(regex.search(cond,getattr(x,val))) for val,cond in ignored.items()) if ignored else False  
-		
-	rows = []	
 	deltas = {0:0} #we need a way to track the progressive ids of tokens of any type, starting from the root
-	for nprog,nid in enumerate([ n[0][0] for n in sorted(list(tree.nodes(data)),key=itemgetter(0)) if n[0]!=(0,0) and n[0][1] == 0 and not no(n[1])]) :
-		deltas[nid] = nprog + 1 - nid  
-	
-	#Warning: what follows is pure index madness
-	for nd in [ n[1] for n in sorted(list(tree.nodes(data)),key=itemgetter(0)) if n[0]!=(0,0) and not no(n[1])] :  
-		if nd.id[1] < 0 : #multiword tokens
-			nd = nd._replace(id=(nd.id[0]+deltas[nd.id[0]],  nd.id[1] - ( deltas[nd.id[0]-nd.id[1]] - deltas[nd.id[0]] ))) 
-			nd = nd._replace(id='-'.join(map(str,[int(nd.id[0]),int(nd.id[0]-nd.id[1])]))) #we produce the correct range to be printed
+	words = 0
+	for n in nodes :
+		if n[idfield][1] == 0 :
+			words += 1
+			deltas[n[idfield][0]] = words - n[idfield][0]
+	
+	rows = []
+	for n in nodes :
+		
+		cells = list(n)
+		i, h = n[idfield], n[headfield] if headfield is not None else '_'
+		
+		if i[1] < 0 : #multiword tokens, whose range is given by a negative number
+			start, end = i[0], i[0] - i[1]
+			cells[idfield] = '{}-{}'.format(int(start+deltas[start]),int(end+deltas[end]))
+			if headfield is not None :
+				cells[headfield] = str(h[0]) if isinstance(h,tuple) else h
 		else :
-			nd = nd._replace(id='.'.join(map(str,[int(i+deltas[nd.id[0]]) for i in nd.id if i != 0])),\
-							 head=(int(nd.head[0]+deltas[nd.head[0]]),0) if syntax else '_' ) 
-		#
-		nd = nd._replace(head=str(nd.head[0]))
+			cells[idfield] = str(int(i[0]+deltas[i[0]])) if i[1] == 0 else '{}.{}'.format(int(i[0]+deltas[i[0]]),int(i[1])) #empty nodes
+			if headfield is not None :
+				cells[headfield] = (str(int(h[0]+deltas[h[0]])) if syntax else '_') if isinstance(h,tuple) else h
 		
-		#Treatment of feats and misc, if any
-		for f in {'feats','misc'}.intersection(nd._fields) : 
-			nd = nd._replace(**{f : writeUDfeatures(getattr(nd,f))})
-		#nd = nd._replace(feats=stampa_stringa_morphoUD(nd.feats),misc=stampa_stringa_morphoUD(nd.misc))
-
-		#Finally, the row
-		rows.append('\t'.join(nd))
+		for f in featsfields : 
+			cells[f] = writeUDfeatures(cells[f])
+		
+		rows.append('\t'.join(cells))
 	#
 	
 	return '\n'.join(rows)+'\n\n'
@@ -161,43 +816,72 @@ def printCoNLLUtree(tree,data='features',ignored={},syntax=True) :
 
 ##Secondary extractive methods
 
+#Returns the features of a node as a named tuple, whatever the representation of the tree (see readCoNLLU)
+#The node is represented just by the index
+def getnode(tree,node) : 
+	
+	if isinstance(tree,CoNLLUSentence) :
+		return tree.node(node)
+	return tree.nodes[node]['features']
+#
+
+#Returns the indices of the direct dependents of a node, whatever the representation of the tree (see readCoNLLU)
+def dependents(tree,node) : 
+	
+	if isinstance(tree,CoNLLUSentence) :
+		return tree.dependents(node)
+	return tree.successors(node)
+#
+
 #Returns only syntactic words
 def syntacticwords(tree) : 
 	
 	for n in sorted(tree) : 
 		if n[0] > 0 and n[1] == 0 :
-			yield tree.nodes[n]['features']
+			yield getnode(tree,n)
 #
 
 #Given a node in a syntactic trees, it extracts a subtree satisfying all conditions for dependency relations and/or parts of speech (set as functional by default, returning it in form of a named tuple combining and counting forms/lemmas/POS/relations/features
 #The node is represented just by the index
+#For compact trees, nuclei are memoised, and the same named tuple is returned for the same arguments: it is immutable but for its fused features, which must not be modified (copy them first, if needed)
 def extractnucleus(tree,node,funcrel=('expl','advmod','discourse','aux','cop','mark','nummod','det','clf','case','cc','punct'),funcpos=('ADV','ADP','AUX','CCONJ','DET','INTJ','NUM','PART','PRON','SCONJ','PUNCT')) : 
 	
-	import networkx as nx
-	from itertools import chain
-	from collections import Counter, namedtuple
+	if isinstance(tree,CoNLLUSentence) :
+		key = ('nucleus',node,frozenset(funcrel) if funcrel else None,frozenset(funcpos) if funcpos else None)
+		if key not in tree.memo :
+			tree.memo[key] = buildnucleus(tree,node,funcrel,funcpos)
+		return tree.memo[key]
+	
+	return buildnucleus(tree,node,funcrel,funcpos)
+#
+
+#Whether a node satisfies the conditions for relations and parts of speech of a nucleus (see extractnucleus)
+def nucleuscriteria(node,funcrel,funcpos) : 
 	
-	Nucleus = namedtuple('Nucleus', 'ids forms lemmas upos feats deprels') 
+	return (node.deprel.split(':')[0] in funcrel if funcrel else True) and (node.upos in funcpos if funcpos else True)
+#
 
-	criteria = lambda x : (tree.nodes[x]['features'].deprel.split(':')[0] in funcrel if funcrel else True) and (tree.nodes[x]['features'].upos in funcpos if funcpos else True)
+#The actual extraction of a nucleus (see extractnucleus)
+def buildnucleus(tree,node,funcrel,funcpos) : 
 	
 	nucleus = [node]
-	corona = list(filter(criteria, nx.descendants_at_distance(tree,node,1) ))  
-	nucleus.extend(corona)
+	corona = [node]
 	
 	while corona :
-		corona = list(chain.from_iterable([filter(criteria, nx.descendants_at_distance(tree,c,1)) for c in corona])) 
+		corona = [d for d in chain.from_iterable([dependents(tree,c) for c in corona]) if nucleuscriteria(getnode(tree,d),funcrel,funcpos)]
 		nucleus.extend(corona)
 	#
 	
 	nucleus = sorted(nucleus) #it might be useful to keep the linear order of the nucleus, especially for printing the form sequence
+	nodes = [getnode(tree,i) for i in nucleus]
+	byid = dict(zip(nucleus,nodes))
 	
-	combonucleus = Nucleus(ids = nucleus,\
-						   forms = tuple([tree.nodes[i]['features'].form for i in nucleus]),\
-						   lemmas = tuple([tree.nodes[i]['features'].lemma for i in nucleus]),\
-						   upos = tuple([tree.nodes[i]['features'].upos for i in nucleus]),\
-						   feats = featsfusion([tree.nodes[i]['features'].feats for i in nucleus]),\
-						   deprels = tuple([tree.nodes[i]['features'].deprel for i in set(nucleus) - {node}]) ) #we usually do not want the relation of our subtree's root, as it is "external"
+	combonucleus = Nucleus(ids = tuple(nucleus),\
+						   forms = tuple([n.form for n in nodes]),\
+						   lemmas = tuple([n.lemma for n in nodes]),\
+						   upos = tuple([n.upos for n in nodes]),\
+						   feats = featsfusion([n.feats for n in nodes]),\
+						   deprels = tuple([byid[i].deprel for i in set(nucleus) - {node}]) ) #we usually do not want the relation of our subtree's root, as it is "external"
 	
 	return combonucleus
 #	
@@ -209,22 +893,183 @@ def treeclimb(tree,node,stop=set(),conj=()) :
 	stop = stop | {'root'}	
 	i = node
 	
-	while ( truehead(tree,tree.nodes[i]['features'].id,conj=conj).deprel if conj else tree.nodes[i]['features'].deprel ) not in stop :
-		i = tree.nodes[i]['features'].head
+	while ( truehead(tree,getnode(tree,i).id,conj=conj).deprel if conj else getnode(tree,i).deprel ) not in stop :
+		i = getnode(tree,i).head
 		
 	return i
 #
 
 #It retrieves the actual head of a node modulo co-ordinations or other flat relations
 #The node is represented just by the index, but a complete node is returned
+#For compact trees, true heads of all nodes are computed at once, and memoised
 def truehead(tree,node,conj=(),sub=False) : 
 
-	i = node
+	if isinstance(tree,CoNLLUSentence) and conj :
+		p = tree.trueheads(conj,sub)[tree.positions[node]]
+		if p >= 0 :
+			return tree.node(tree.columns[0][p])
+	
+	i = getnode(tree,node)
+	
+	while (i.deprel.split(':')[0] if not sub else i.deprel) in conj : 
+		i = getnode(tree,i.head)
+	
+	return i 
+#
+
+
+
+##Queries over whole corpora
+
+#Pattern of a node, to be searched in a corpus (see CoNLLUIndex): required values of some fields (a string, or a collection of alternative strings), among form, lemma, upos, deprel and rel (the relation without subtypes), and patterns which have to be matched by its head, by its true head modulo some relations (see truehead), and by at least one of its dependents, for every pattern given
+#E.g. ADVs whose true head (modulo co-ordination) is a NOUN with a case dependent: NodePattern(upos='ADV',truehead=NodePattern(upos='NOUN',dependents=[NodePattern(rel='case')]),conj=('conj',))
+class NodePattern : 
+	
+	__slots__ = ('fields','head','truehead','dependents','conj','sub')
+	
+	def __init__(self,head=None,truehead=None,dependents=(),conj=(),sub=False,**fields) : 
+		self.fields = {f:((v,) if isinstance(v,str) else tuple(v)) for f,v in fields.items()}
+		self.head = head
+		self.truehead = truehead
+		self.dependents = tuple(dependents)
+		self.conj = conj
+		self.sub = sub
+#
+
+#Index of a whole corpus, built once, so that patterns of nodes (see NodePattern) are found without reading and walking the trees again
+#All nodes of all trees are laid out one after the other, and identified by their global position; fields are stored as codes of a symbol table (see SymbolTable), heads as the positions of their parents (-1 if none), and dependents by means of a child-offset index, as in CoNLLUSentence
+#For every field, an inverted index gives the positions of the nodes with a given value; inverted indices and true heads are computed only when needed, and kept until the corpus changes
+#Nodes are returned as couples (sentence,node), i.e. the position of the sentence in the corpus (see sentences for its comments) and the index of the node
+class CoNLLUIndex : 
 	
-	while (tree.nodes[i]['features'].deprel.split(':')[0] if not sub else tree.nodes[i]['features'].deprel) in conj : 
-		i = tree.nodes[i]['features'].head
+	fields = ('form','lemma','upos','deprel')
 	
-	return tree.nodes[i]['features'] 
+	def __init__(self,trees=(),symbols=None) : 
+		
+		self.symbols = SymbolTable(self.fields) if symbols is None else symbols
+		self.sentences = []
+		self.ids = []
+		self.sentstart = array('l',[0])
+		self.parent = array('l')
+		self.childstart = array('l',[0])
+		self.children = array('l')
+		self.columns = {f:array('l') for f in self.fields}
+		self.memo = {}
+		
+		for sentence, tree in trees :
+			self.add(sentence,tree)
+	
+	def __len__(self) : 
+		return len(self.ids)
+	
+	#A tree of any representation (see readCoNLLU) is added at the end of the corpus
+	def add(self,sentence,tree) : 
+		
+		if not isinstance(tree,CoNLLUSentence) :
+			tree = CoNLLUSentence([tree.nodes[n]['features'] for n in tree])
+		
+		offset, childoffset = len(self.ids), len(self.children)
+		self.sentences.append(sentence)
+		self.ids.extend(tree)
+		for f in self.fields :
+			self.columns[f].extend(self.symbols.encode(tree.column(f)))
+		self.parent.fromlist([offset + tree.positions[h] if h in tree.positions else -1 for h in tree.column('head')])
+		self.childstart.fromlist([childoffset + c for c in tree.childstart[1:]])
+		self.children.fromlist([offset + c for c in tree.children])
+		self.sentstart.append(len(self.ids))
+		self.memo.clear()
+	
+	#The sentence and index of a node
+	def locate(self,position) : 
+		
+		return bisect_right(self.sentstart,position) - 1, self.ids[position]
+	
+	#Positions of the dependents of a node
+	def dependents(self,position) : 
+		return self.children[self.childstart[position]:self.childstart[position+1]]
+	
+	#Inverted index of a field: positions of the nodes for every code (for rel, the code of the relation without subtypes)
+	def postings(self,field) : 
+		
+		key = ('postings',field)
+		if key not in self.memo :
+			if field == 'rel' :
+				based = self.symbols.based
+				column = [based[c] for c in self.columns['deprel']]
+			elif field in self.columns :
+				column = self.columns[field]
+			else :
+				raise Exception('Careful! Nodes can only be searched by {}.'.format(', '.join(self.fields + ('rel',))))
+			postings = {}
+			for p,c in enumerate(column) :
+				if c not in postings :
+					postings[c] = array('l')
+				postings[c].append(p)
+			self.memo[key] = postings
+		
+		return self.memo[key]
+	
+	#Positions of the true nodes of all nodes modulo given relations (see CoNLLUSentence.trueheads), whose heads are the true heads; -1 for nodes which cannot be reached from a root
+	def trueheads(self,conj=(),sub=False) : 
+		
+		key = ('truehead',frozenset(conj),sub)
+		if key not in self.memo :
+			
+			strings, based = self.symbols.strings, self.symbols.based
+			deprels = self.columns['deprel']
+			heads = array('l',[-1])*len(self)
+			
+			for root in self.sentstart[:-1] :
+				heads[root] = root
+				queue = [root]
+				for p in queue : #the queue grows while it is read
+					for c in self.children[self.childstart[p]:self.childstart[p+1]] :
+						heads[c] = heads[p] if strings[deprels[c] if sub else based[deprels[c]]] in conj else c
+						queue.append(c)
+			
+			self.memo[key] = heads
+		
+		return self.memo[key]
+	
+	#Set of the positions of the nodes matching a pattern; fields are matched by means of inverted indices, relations by means of the arrays of parents and true heads
+	def match(self,pattern) : 
+		
+		candidates = None
+		for f,values in pattern.fields.items() :
+			postings = self.postings(f)
+			found = set()
+			for v in values :
+				if v in self.symbols.index :
+					found.update(postings.get(self.symbols.index[v],()))
+			candidates = found if candidates is None else candidates & found
+		if candidates is None : #any node apart from the roots
+			candidates = set(range(len(self))) - set(self.sentstart)
+		
+		for d in pattern.dependents :
+			candidates &= {self.parent[c] for c in self.match(d)}
+		if pattern.head is not None and candidates :
+			heads = self.match(pattern.head)
+			candidates = {c for c in candidates if self.parent[c] in heads}
+		if pattern.truehead is not None and candidates :
+			heads, trueheads = self.match(pattern.truehead), self.trueheads(pattern.conj,pattern.sub)
+			candidates = {c for c in candidates if trueheads[c] >= 0 and self.parent[trueheads[c]] in heads}
+		
+		return candidates
+	
+	#All nodes matching a pattern, in the order of the corpus, as couples (sentence,node)
+	def search(self,pattern) : 
+		return [self.locate(p) for p in sorted(self.match(pattern))]
+#
+
+#Index of a whole CoNLL-U document, or of several ones (see CoNLLUIndex); reading options are as for readCoNLLU
+def indexCoNLLU(conllu,**options) : 
+	
+	index = CoNLLUIndex()
+	for document in ([conllu] if isinstance(conllu,str) else conllu) :
+		for sentence, tree in readCoNLLU(document,compact=True,**options) :
+			index.add(sentence,tree)
+	
+	return index
 #
 
 
@@ -234,15 +1079,12 @@ def truehead(tree,node,conj=(),sub=False) :
 #It takes a list of feats-like dictionaries and fuses it in one, taking into count the multiplicity of feature values (e.g. Polarity=Neg appearing twice as opposed to once, which can make a difference in some languages)
 def featsfusion(flist) : 
 
-	from collections import defaultdict,Counter
-	import collections.abc
-	
 	fusion = defaultdict(Counter)
 	
 	for d in flist :
 		for k,v in d.items() :
 			
-			multi = isinstance(v,collections.abc.Iterable) and not isinstance(v,str) #we accept both bare values, or tuples of values
+			multi = isinstance(v,Iterable) and not isinstance(v,str) #we accept both bare values, or tuples of values
 			
 			fusion[k].update(v if multi else tuple(v,))
 	#